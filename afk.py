@@ -1,42 +1,126 @@
 import discord
-import json
+import time
+from emoji_registry import get_emoji
 from datetime import datetime
+from persistence import WriteBehind
+from storage import async_storage, GLOBAL_GUILD_ID
+from cache import LRUCache
+from keylocks import KeyedLocks
+from outbound import outbound
+from metrics import metrics
+import config
 
-def load_emojis():
-    """Load emojis from emojis.json"""
-    try:
-        with open('emojis.json', 'r') as f:
-            data = json.load(f)
-            return data['emojis']
-    except FileNotFoundError:
-        return {}
-
-def load_afk_data():
-    """Load AFK user data from afk_data.json"""
-    try:
-        with open('afk_data.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+# Bucket for AFK entries that apply in every guild (set in DMs, or from before AFK was per guild)
+GLOBAL_AFK = GLOBAL_GUILD_ID
+
+class AfkStore:
+    """AFK users per guild, kept in memory and written back to storage in batches"""
+
+    def __init__(self):
+        # guild ID -> {user ID -> AFK info}, the inner dict doubles as the guild's AFK set
+        self.guilds = {}
+        # (guild ID, user ID) pairs changed since the last write
+        self._dirty = set()
+        self.writer = WriteBehind(self.save)
+
+    async def load(self):
+        """Load AFK data from storage, called once at startup"""
+        self.guilds = await async_storage.load_afk()
+
+    async def save(self):
+        dirty, self._dirty = self._dirty, set()
+        upserts = {}
+        for key in dirty:
+            guild_id, user_id = key
+            info = self.guilds.get(guild_id, {}).get(user_id)
+            if info is not None:
+                upserts[key] = info
+        try:
+            await async_storage.write_afk(upserts, dirty - upserts.keys())
+        except Exception:
+            self._dirty |= dirty
+            raise
+
+    async def flush(self):
+        """Write pending changes to storage now (used on shutdown)"""
+        await self.writer.flush()
+
+    def has_afk(self, guild_id):
+        """Whether anyone could be AFK in this guild"""
+        return bool(self.guilds.get(guild_id) or self.guilds.get(GLOBAL_AFK))
 
-def save_afk_data(data):
-    """Save AFK user data to afk_data.json"""
-    with open('afk_data.json', 'w') as f:
-        json.dump(data, f, indent=2)
+    def lookup(self, guild_id, user_id):
+        """(bucket, info) for an AFK user in this guild, or None"""
+        for bucket in (guild_id, GLOBAL_AFK):
+            info = self.guilds.get(bucket, {}).get(user_id)
+            if info is not None:
+                return bucket, info
+        return None
+
+    def set(self, guild_id, user_id, info):
+        self.guilds.setdefault(guild_id, {})[user_id] = info
+        self._dirty.add((guild_id, user_id))
+        self.writer.mark_dirty()
+
+    def remove(self, guild_id, user_id):
+        users = self.guilds.get(guild_id)
+        if not users or users.pop(user_id, None) is None:
+            return
+        if not users:
+            del self.guilds[guild_id]
+        self._dirty.add((guild_id, user_id))
+        self.writer.mark_dirty()
+
+afk_store = AfkStore()
+
+# Serialise AFK changes per (guild, user) so setting AFK and welcoming back can't interleave
+afk_locks = KeyedLocks()
+
+# Authors of replied-to messages we had to fetch over REST, keyed by message ID
+reply_authors = LRUCache(config.REPLY_AUTHOR_CACHE_SIZE)
+
+# Returned by cached_reply_author when only a REST fetch could tell
+UNKNOWN = object()
+
+def cached_reply_author(message):
+    """Author ID of the replied-to message if known without a REST call, None if there is none, else UNKNOWN"""
+    reference = message.reference
+    if reference is None or reference.message_id is None:
+        return None
+    
+    # Discord usually sends the replied message along with the reply
+    resolved = reference.resolved
+    if isinstance(resolved, discord.Message):
+        return resolved.author.id
+    if isinstance(resolved, discord.DeletedReferencedMessage):
+        return None
+    
+    # Then the client's message cache, then our own cache of earlier fetches
+    cached = reference.cached_message
+    if cached is not None:
+        return cached.author.id
+    return reply_authors.get(reference.message_id, UNKNOWN)
+
+async def resolve_reply_author(message):
+    """Author ID of the message being replied to, avoiding a REST fetch where possible"""
+    author_id = cached_reply_author(message)
+    if author_id is not UNKNOWN:
+        return author_id
+    
+    reference = message.reference
+    replied_message = await message.channel.fetch_message(reference.message_id)
+    reply_authors.put(reference.message_id, replied_message.author.id)
+    return replied_message.author.id
 
 async def send_afk_embed(ctx, status="AFK"):
     """Send AFK embed with approve emoji"""
-    emojis = load_emojis()
-    emoji_id = emojis.get("approve")
-    
-    # Create emoji string from ID
-    emoji_str = f"<:custom:{emoji_id}>" if emoji_id else "✅"
+    emoji_str = get_emoji("approve", "✅")
     
     embed = discord.Embed(
         description=f"{emoji_str} {ctx.author.mention}: You're now AFK with the status: **{status}**",
         color=discord.Color.green()
     )
-    await ctx.send(embed=embed)
+    await outbound.reply(ctx.channel, embed)
 
 async def afk_command(ctx, status=None):
     """Mark user as AFK with optional custom status"""
@@ -44,120 +128,140 @@ async def afk_command(ctx, status=None):
         # Use custom status if provided, otherwise default to AFK
         afk_status = status if status else "AFK"
         
-        # Save AFK data
-        afk_data = load_afk_data()
-        afk_data[str(ctx.author.id)] = {
-            "status": afk_status,
-            "timestamp": datetime.now().isoformat()
-        }
-        save_afk_data(afk_data)
+        # Save AFK data, scoped to this guild
+        guild_id = ctx.guild.id if ctx.guild else GLOBAL_AFK
+        async with afk_locks((guild_id, ctx.author.id)):
+            afk_store.set(guild_id, ctx.author.id, {
+                "status": afk_status,
+                "timestamp": datetime.now().isoformat()
+            })
         
         await send_afk_embed(ctx, afk_status)
     except Exception as e:
         print(f"Error in AFK command: {e}")
+        metrics.count_error("command", "afk")
+
+def is_afk_relevant(message):
+    """Cheap check for whether a message could involve an AFK user at all"""
+    if message.author.bot:
+        return False
+    
+    guild_id = message.guild.id if message.guild else GLOBAL_AFK
+    if not afk_store.has_afk(guild_id):
+        return False
+    
+    # The author is returning, or is pinging or replying to someone AFK
+    if afk_store.lookup(guild_id, message.author.id):
+        return True
+    if any(afk_store.lookup(guild_id, user.id) for user in message.mentions):
+        return True
+    replied_author_id = cached_reply_author(message)
+    if replied_author_id is UNKNOWN:
+        return True
+    return replied_author_id is not None and afk_store.lookup(guild_id, replied_author_id) is not None
+
+def format_time_away(timestamp):
+    """Human readable time since an ISO timestamp"""
+    afk_datetime = datetime.fromisoformat(timestamp)
+    now = datetime.now()
+    time_diff = now - afk_datetime
+    total_seconds = int(time_diff.total_seconds())
+    
+    # Format time display
+    if total_seconds < 60:
+        return f"{total_seconds} seconds"
+    elif total_seconds < 3600:
+        minutes = total_seconds // 60
+        seconds = total_seconds % 60
+        return f"{minutes} minutes and {seconds} seconds"
+    else:
+        hours = total_seconds // 3600
+        return f"{hours} hour{'s' if hours > 1 else ''}"
+
+class NotificationCooldown:
+    """Remembers when each AFK user was last announced in each channel"""
+
+    def __init__(self, cooldown, maxsize=10000):
+        self.cooldown = cooldown
+        # (channel ID, user ID) -> monotonic time of the last notification
+        self._last_sent = LRUCache(maxsize)
+
+    def should_notify(self, channel_id, user_id):
+        """True if the user wasn't announced in this channel within the cooldown, and starts a new one"""
+        now = time.monotonic()
+        key = (channel_id, user_id)
+        last_sent = self._last_sent.get(key)
+        if last_sent is not None and now - last_sent < self.cooldown:
+            return False
+        self._last_sent.put(key, now)
+        return True
+
+notification_cooldown = NotificationCooldown(config.AFK_NOTIFY_COOLDOWN)
 
 async def handle_message(message):
     """Handle welcome back message for AFK users and AFK notifications"""
     if message.author.bot:
         return
     
-    afk_data = load_afk_data()
-    user_id = str(message.author.id)
+    guild_id = message.guild.id if message.guild else GLOBAL_AFK
     
-    # Check if user is replying to or mentioning an AFK user
-    replied_user_id = None
+    # Nobody is AFK in this guild, so there is nothing to notify or welcome back
+    if not afk_store.has_afk(guild_id):
+        return
+    
+    # Collect everyone AFK this message replies to or mentions, in order, once each
+    target_ids = []
     if message.reference:
         try:
-            replied_message = await message.channel.fetch_message(message.reference.message_id)
-            replied_user_id = str(replied_message.author.id)
-            
-            # Check if replied user is AFK
-            if replied_user_id in afk_data:
-                afk_info = afk_data[replied_user_id]
-                afk_datetime = datetime.fromisoformat(afk_info["timestamp"])
-                now = datetime.now()
-                time_diff = now - afk_datetime
-                total_seconds = int(time_diff.total_seconds())
-                
-                # Format time display
-                if total_seconds < 60:
-                    time_display = f"{total_seconds} seconds ago"
-                elif total_seconds < 3600:
-                    minutes = total_seconds // 60
-                    seconds = total_seconds % 60
-                    time_display = f"{minutes} minutes and {seconds} seconds ago"
-                else:
-                    hours = total_seconds // 3600
-                    time_display = f"{hours} hour{'s' if hours > 1 else ''} ago"
-                
-                # Send AFK notification embed
-                embed = discord.Embed(
-                    description=f"💤 <@{replied_user_id}> is AFK: **{afk_info['status']}** - {time_display}",
-                    color=discord.Color.from_rgb(79, 84, 92)
-                )
-                await message.channel.send(embed=embed)
-                return
+            replied_user_id = await resolve_reply_author(message)
+            if replied_user_id:
+                target_ids.append(replied_user_id)
         except Exception as e:
             print(f"Error checking replied message: {e}")
+            metrics.count_error("event", "on_message")
+    target_ids.extend(user.id for user in message.mentions)
     
-    # Check if mentioning an AFK user
-    for mentioned_user in message.mentions:
-        mentioned_user_id = str(mentioned_user.id)
-        if mentioned_user_id in afk_data:
-            afk_info = afk_data[mentioned_user_id]
-            afk_datetime = datetime.fromisoformat(afk_info["timestamp"])
-            now = datetime.now()
-            time_diff = now - afk_datetime
-            total_seconds = int(time_diff.total_seconds())
-            
-            # Format time display
-            if total_seconds < 60:
-                time_display = f"{total_seconds} seconds ago"
-            elif total_seconds < 3600:
-                minutes = total_seconds // 60
-                seconds = total_seconds % 60
-                time_display = f"{minutes} minutes and {seconds} seconds ago"
-            else:
-                hours = total_seconds // 3600
-                time_display = f"{hours} hour{'s' if hours > 1 else ''} ago"
-            
-            # Send AFK notification embed
-            embed = discord.Embed(
-                description=f"💤 <@{mentioned_user_id}> is AFK: **{afk_info['status']}** - {time_display}",
-                color=discord.Color.from_rgb(79, 84, 92)
-            )
-            await message.channel.send(embed=embed)
-            return
+    lines = []
+    for target_id in dict.fromkeys(target_ids):
+        afk_entry = afk_store.lookup(guild_id, target_id)
+        if not afk_entry or target_id == message.author.id:
+            continue
+        # Skip users already announced in this channel a moment ago
+        if not notification_cooldown.should_notify(message.channel.id, target_id):
+            continue
+        afk_info = afk_entry[1]
+        time_display = format_time_away(afk_info["timestamp"])
+        lines.append(f"💤 <@{target_id}> is AFK: **{afk_info['status']}** - {time_display} ago")
+    
+    # Send one AFK notification embed covering every AFK user
+    if lines:
+        embed = discord.Embed(
+            description="\n".join(lines),
+            color=discord.Color.from_rgb(79, 84, 92)
+        )
+        outbound.notify(message.channel, embed)
+        return
     
     # Check if user is AFK (returning)
-    if user_id in afk_data:
-        # Calculate time away
-        afk_time = afk_data[user_id]["timestamp"]
-        afk_datetime = datetime.fromisoformat(afk_time)
-        now = datetime.now()
-        time_diff = now - afk_datetime
+    if not afk_store.lookup(guild_id, message.author.id):
+        return
+    
+    async with afk_locks((guild_id, message.author.id)):
+        # Another message may have welcomed them back while we waited
+        afk_entry = afk_store.lookup(guild_id, message.author.id)
+        if not afk_entry:
+            return
         
-        # Get time display
-        total_seconds = int(time_diff.total_seconds())
+        # Remove user from AFK list before queueing, so the entry can't outlive a failed send
+        bucket, afk_info = afk_entry
+        afk_store.remove(bucket, message.author.id)
         
-        # Format time display
-        if total_seconds < 60:
-            time_display = f"{total_seconds} seconds"
-        elif total_seconds < 3600:
-            minutes = total_seconds // 60
-            seconds = total_seconds % 60
-            time_display = f"{minutes} minutes and {seconds} seconds"
-        else:
-            hours = total_seconds // 3600
-            time_display = f"{hours} hour{'s' if hours > 1 else ''}"
+        # Calculate time away
+        time_display = format_time_away(afk_info["timestamp"])
         
         # Send welcome back embed
         embed = discord.Embed(
             description=f"👋 {message.author.mention}: Welcome back, you were away for **{time_display}**",
             color=discord.Color.from_rgb(79, 84, 92)
         )
-        await message.channel.send(embed=embed)
-        
-        # Remove user from AFK list
-        del afk_data[user_id]
-        save_afk_data(afk_data)
+        outbound.notify(message.channel, embed)
@@ -0,0 +1,378 @@
+"""Offline benchmark for the message, delete, snipe and lock paths.
+
+Drives the real handlers with lightweight fake Discord objects, no network involved:
+
+    python bench.py --events 50000 --rate 1000 --json after.json --compare before.json
+
+State is written to a throwaway directory, so runs don't touch the bot's own data.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+WORDS = (
+    "hello", "raid", "spam", "link", "ban", "mod", "gg", "lol", "anyone", "here", "free", "nitro",
+    "giveaway", "click", "server", "voice", "stream", "tonight", "meme", "ping", "help", "please"
+)
+
+# Fakes, carrying only what the handlers read
+
+class FakePermissions:
+    manage_channels = True
+    manage_messages = True
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+        self.avatar = None
+        self.guild_permissions = FakePermissions()
+
+    def __str__(self):
+        return self.name
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.me = FakeUser(0)
+        self.default_role = object()
+
+class FakeMessage:
+    def __init__(self, message_id, author, channel, content="", mentions=()):
+        self.id = message_id
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.mentions = list(mentions)
+        self.reference = None
+
+    async def add_reaction(self, emoji):
+        self.channel.sends += 1
+
+    async def edit(self, **kwargs):
+        self.channel.sends += 1
+
+class FakeChannel:
+    def __init__(self, channel_id, guild):
+        self.id = channel_id
+        self.guild = guild
+        self.name = f"channel{channel_id}"
+        self.mention = f"<#{channel_id}>"
+        self.sends = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sends += 1
+        return FakeMessage(0, self.guild.me, self)
+
+    async def set_permissions(self, target, **kwargs):
+        self.sends += 1
+
+class FakeContext:
+    def __init__(self, message):
+        self.message = message
+        self.author = message.author
+        self.channel = message.channel
+        self.guild = message.guild
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+# Measurements
+
+def read_io_bytes():
+    """Bytes this process has passed to write(), None where /proc isn't available"""
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def disk_bytes(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names
+    )
+
+def summarize(latencies, errors, seconds):
+    ordered = sorted(latencies)
+    if len(ordered) >= 2:
+        cuts = statistics.quantiles(ordered, n=100, method='inclusive')
+        p50, p99 = cuts[49], cuts[98]
+    else:
+        p50 = p99 = ordered[0] if ordered else 0.0
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "throughput": len(ordered) / seconds if seconds else 0.0,
+        "p50_ms": p50 * 1000,
+        "p99_ms": p99 * 1000,
+    }
+
+# Workload
+
+class Workload:
+    def __init__(self, args):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.guilds = [FakeGuild(1000 + g) for g in range(args.guilds)]
+        self.channels = [
+            FakeChannel(100000 + g * args.channels + c, guild)
+            for g, guild in enumerate(self.guilds) for c in range(args.channels)
+        ]
+        self.users = [FakeUser(10 + u) for u in range(args.users)]
+        self.next_message_id = 1 << 40
+        self.recent = []
+        self.latencies = {}
+        self.errors = {}
+        weights = {"message": args.message_weight, "delete": args.delete_weight,
+                   "snipe": args.snipe_weight, "lock": args.lock_weight}
+        self.kinds = [kind for kind, weight in weights.items() if weight > 0]
+        self.weights = [weights[kind] for kind in self.kinds]
+
+    def new_message(self):
+        self.next_message_id += 1
+        channel = self.random.choice(self.channels)
+        author = self.random.choice(self.users)
+        content = " ".join(self.random.choices(WORDS, k=self.random.randint(2, 12)))
+        mentions = []
+        if self.random.random() < self.args.mention_rate:
+            mentions.append(self.random.choice(self.users))
+        return FakeMessage(self.next_message_id, author, channel, content, mentions)
+
+    async def setup_afk(self, afk):
+        count = int(len(self.users) * self.args.afk_fraction)
+        for user in self.random.sample(self.users, count):
+            for guild in self.guilds:
+                afk.afk_store.set(guild.id, user.id, {"status": "bench", "timestamp": "2024-01-01T00:00:00"})
+
+    async def run_one(self, kind, bot):
+        afk, snipe, lock = bot
+        if kind == "message":
+            message = self.new_message()
+            # Same order as main.on_message
+            snipe.remember_message(message)
+            if afk.is_afk_relevant(message):
+                await afk.handle_message(message)
+            self.recent.append(message)
+            if len(self.recent) > 10000:
+                del self.recent[:5000]
+        elif kind == "delete":
+            if not self.recent:
+                return
+            message = self.recent.pop(self.random.randrange(len(self.recent)))
+            await snipe.track_message_delete(message)
+        elif kind == "snipe":
+            ctx = FakeContext(self.new_message())
+            await snipe.snipe_command(ctx, 1)
+        elif kind == "lock":
+            ctx = FakeContext(self.new_message())
+            if lock.lock_index.get(ctx.guild.id, ctx.channel.id) is None:
+                await lock.lock_channel(ctx)
+            else:
+                await lock.unlock_channel(ctx)
+
+    async def timed(self, kind, bot):
+        started = time.perf_counter()
+        try:
+            await self.run_one(kind, bot)
+        except Exception:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+        self.latencies.setdefault(kind, []).append(time.perf_counter() - started)
+
+    async def run(self, bot):
+        args = self.args
+        kinds = self.random.choices(self.kinds, self.weights, k=args.events)
+        started = time.perf_counter()
+        if args.rate <= 0:
+            # Flat out, one event at a time
+            for kind in kinds:
+                await self.timed(kind, bot)
+        else:
+            # Paced like gateway dispatch: every event is its own task, started on schedule
+            tasks = []
+            for index, kind in enumerate(kinds):
+                delay = started + index / args.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self.timed(kind, bot)))
+            await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+async def bench(args, workdir):
+    # Imported late so config picks up the environment set in main()
+    import afk
+    import lock
+    import snipe
+    from outbound import outbound
+    from storage import async_storage
+
+    await async_storage.open()
+    await afk.afk_store.load()
+    await snipe.snipe_store.load()
+    await lock.lock_index.load()
+
+    workload = Workload(args)
+    await workload.setup_afk(afk)
+    await afk.afk_store.flush()
+
+    io_before = read_io_bytes()
+    seconds = await workload.run((afk, snipe, lock))
+
+    # Let queued sends and debounced writes finish, they are part of the cost
+    flush_started = time.perf_counter()
+    while outbound.stats()["channels"]:
+        await asyncio.sleep(0.01)
+    await afk.afk_store.flush()
+    await snipe.snipe_store.flush()
+    flush_seconds = time.perf_counter() - flush_started
+    io_after = read_io_bytes()
+    await async_storage.close()
+
+    total = sum(len(latencies) for latencies in workload.latencies.values())
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+        "seconds": seconds,
+        "flush_seconds": flush_seconds,
+        "throughput": total / seconds if seconds else 0.0,
+        "ops": {
+            kind: summarize(latencies, workload.errors.get(kind, 0), seconds)
+            for kind, latencies in sorted(workload.latencies.items())
+        },
+        "bytes_written": io_after - io_before if io_before is not None and io_after is not None else None,
+        "disk_bytes": disk_bytes(workdir),
+        "peak_rss_kb": peak_rss_kb(),
+        "sends": sum(channel.sends for channel in workload.channels),
+        "outbound": outbound.stats(),
+    }
+
+# Reporting
+
+def _format(value, unit=""):
+    if value is None:
+        return "n/a"
+    if isinstance(value, float):
+        return f"{value:,.2f}{unit}"
+    return f"{value:,}{unit}"
+
+def print_report(result):
+    print(f"{'op':<10}{'count':>10}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for kind, stats in result["ops"].items():
+        print(f"{kind:<10}{stats['count']:>10,}{stats['throughput']:>12,.0f}"
+              f"{stats['p50_ms']:>10.3f}{stats['p99_ms']:>10.3f}{stats['errors']:>8}")
+    print()
+    print(f"throughput     {_format(result['throughput'], ' events/s')} over {result['seconds']:.2f}s")
+    print(f"final flush    {_format(result['flush_seconds'], 's')}")
+    print(f"bytes written  {_format(result['bytes_written'])}")
+    print(f"on disk        {_format(result['disk_bytes'])}")
+    print(f"peak RSS       {_format(result['peak_rss_kb'], ' KiB')}")
+    print(f"sends          {_format(result['sends'])} ({result['outbound']['coalesced']} notices coalesced)")
+
+def compare(result, baseline, threshold):
+    """Print changes against a baseline run, returns the regressions beyond threshold (a fraction)"""
+    regressions = []
+
+    def check(label, old, new, higher_is_better):
+        if old is None or new is None or not old:
+            return
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > threshold:
+            flag = "  REGRESSION"
+            regressions.append(label)
+        print(f"{label:<24}{_format(old):>16}{_format(new):>16}{change:>+10.1%}{flag}")
+
+    differing = sorted(
+        key for key in set(result["config"]) | set(baseline.get("config", {}))
+        if result["config"].get(key) != baseline.get("config", {}).get(key)
+    )
+    if differing:
+        print(f"Note: runs used different settings ({', '.join(differing)}), changes may not be comparable")
+    print(f"{'metric':<24}{'baseline':>16}{'current':>16}{'change':>10}")
+    check("throughput", baseline.get("throughput"), result["throughput"], True)
+    for kind, stats in result["ops"].items():
+        old = baseline.get("ops", {}).get(kind)
+        if old is None:
+            continue
+        check(f"{kind} p50 ms", old["p50_ms"], stats["p50_ms"], False)
+        check(f"{kind} p99 ms", old["p99_ms"], stats["p99_ms"], False)
+    check("bytes written", baseline.get("bytes_written"), result["bytes_written"], False)
+    check("peak RSS KiB", baseline.get("peak_rss_kb"), result["peak_rss_kb"], False)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bot handlers offline')
+    parser.add_argument('--events', type=int, default=20000, help='events to run')
+    parser.add_argument('--rate', type=float, default=0, help='events per second, 0 runs them back to back')
+    parser.add_argument('--guilds', type=int, default=10)
+    parser.add_argument('--channels', type=int, default=20, help='channels per guild')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--afk-fraction', type=float, default=0.05, help='share of users AFK in every guild')
+    parser.add_argument('--mention-rate', type=float, default=0.1, help='share of messages mentioning someone')
+    parser.add_argument('--message-weight', type=float, default=80)
+    parser.add_argument('--delete-weight', type=float, default=15)
+    parser.add_argument('--snipe-weight', type=float, default=4)
+    parser.add_argument('--lock-weight', type=float, default=1)
+    parser.add_argument('--backend', choices=('sqlite', 'json'), default='sqlite')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='baseline results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative change counted as a regression (default 0.10)')
+    args = parser.parse_args()
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, repo)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    with tempfile.TemporaryDirectory(prefix='bot-bench-') as workdir:
+        os.environ['STORAGE_BACKEND'] = args.backend
+        os.environ['SQLITE_PATH'] = os.path.join(workdir, 'bot.db')
+        # The JSON backend and the emoji registry use paths relative to the working directory
+        os.chdir(workdir)
+        from persistence import shutdown_io
+        try:
+            result = asyncio.run(bench(args, workdir))
+        finally:
+            shutdown_io()
+            os.chdir(repo)
+
+    print_report(result)
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(result, f, indent=2)
+    if baseline is not None:
+        print()
+        if compare(result, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
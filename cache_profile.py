@@ -0,0 +1,143 @@
+import itertools
+import sys
+import discord
+import config
+
+# Client cache settings per profile. None leaves discord.py's own default in place.
+PROFILES = {
+    "default": {
+        "max_messages": 1000,
+        "member_cache_flags": None,
+        "chunk_guilds_at_startup": None,
+        "minimal_intents": False,
+    },
+    # Only what lock, AFK and snipe use. Snipe's content cache and AFK's reply author
+    # cache keep the little message data those need, so discord.py's message cache goes.
+    "lean": {
+        "max_messages": 0,
+        "member_cache_flags": "none",
+        "chunk_guilds_at_startup": False,
+        "minimal_intents": True,
+    },
+}
+
+# Cached objects measured per cache when estimating its memory
+SAMPLE_SIZE = 50
+
+def build_intents(minimal):
+    """Intents the bot needs, plus discord.py's defaults unless minimal"""
+    if minimal:
+        # Channels and roles for locking, messages for AFK and snipe, nothing else
+        intents = discord.Intents.none()
+        intents.dm_messages = True
+    else:
+        intents = discord.Intents.default()
+    intents.message_content = True
+    intents.guilds = True
+    intents.guild_messages = True
+    return intents
+
+def _member_cache_flags(spec, intents):
+    """MemberCacheFlags from "none", "from_intents" or a comma list of flag names"""
+    if spec is None:
+        return None
+    if spec == "from_intents":
+        return discord.MemberCacheFlags.from_intents(intents)
+    flags = discord.MemberCacheFlags.none()
+    for name in filter(None, (part.strip() for part in spec.split(','))):
+        if name != "none":
+            setattr(flags, name, True)
+    return flags
+
+def client_options(profile=None):
+    """Keyword arguments for the bot's constructor under the configured cache profile.
+
+    MESSAGE_CACHE_SIZE, MEMBER_CACHE_FLAGS and CHUNK_GUILDS_AT_STARTUP override
+    single settings of the profile.
+    """
+    profile = profile or config.CACHE_PROFILE
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown cache profile {profile!r}, expected one of {', '.join(PROFILES)}")
+    settings = dict(PROFILES[profile])
+    if config.MESSAGE_CACHE_SIZE:
+        settings["max_messages"] = int(config.MESSAGE_CACHE_SIZE)
+    if config.MEMBER_CACHE_FLAGS:
+        settings["member_cache_flags"] = config.MEMBER_CACHE_FLAGS
+    if config.CHUNK_GUILDS_AT_STARTUP:
+        settings["chunk_guilds_at_startup"] = config.CHUNK_GUILDS_AT_STARTUP.lower() in ("1", "true", "yes")
+
+    intents = build_intents(settings["minimal_intents"])
+    options = {
+        "intents": intents,
+        # discord.py turns the message cache off for None, not 0
+        "max_messages": settings["max_messages"] or None,
+    }
+    member_cache_flags = _member_cache_flags(settings["member_cache_flags"], intents)
+    if member_cache_flags is not None:
+        options["member_cache_flags"] = member_cache_flags
+    if settings["chunk_guilds_at_startup"] is not None:
+        options["chunk_guilds_at_startup"] = settings["chunk_guilds_at_startup"]
+    return options
+
+_LEAVES = (str, bytes, int, float)
+
+def _attribute_values(obj):
+    if isinstance(obj, (tuple, list)):
+        return list(obj)
+    values = list(getattr(obj, '__dict__', {}).values())
+    for cls in type(obj).__mro__:
+        slots = getattr(cls, '__slots__', ())
+        for slot in (slots,) if isinstance(slots, str) else slots:
+            if slot not in ('__dict__', '__weakref__'):
+                values.append(getattr(obj, slot, None))
+    return values
+
+def own_size(obj):
+    """Bytes of obj and the plain values it holds, without other objects it refers to.
+
+    Cached models point at their guild, state and each other, so following every
+    reference would count the whole client for each one.
+    """
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    for value in _attribute_values(obj):
+        if isinstance(value, _LEAVES):
+            size += sys.getsizeof(value)
+        elif isinstance(value, (list, tuple, set, frozenset, dict)):
+            items = value.values() if isinstance(value, dict) else value
+            size += sys.getsizeof(value) + sum(sys.getsizeof(item) for item in items if isinstance(item, _LEAVES))
+    return size
+
+def estimate(objects, count):
+    """(count, approximate bytes) from the mean own_size of the first SAMPLE_SIZE objects"""
+    sample = list(itertools.islice(objects, SAMPLE_SIZE))
+    if not sample:
+        return count, 0
+    return count, int(sum(map(own_size, sample)) / len(sample) * count)
+
+def cache_report(bot, extra=None):
+    """{cache name: (entries, approximate bytes)} for discord.py's caches and any extra ones.
+
+    extra maps names to callables returning (entries, bytes) for caches kept outside discord.py.
+    """
+    guilds = bot.guilds
+    # guild.members and guild.channels copy the whole cache into a new list on every access
+    report = {
+        "messages": estimate(bot.cached_messages, len(bot.cached_messages)),
+        "guilds": estimate(guilds, len(guilds)),
+        "channels": estimate(
+            (channel for guild in guilds for channel in guild._channels.values()),
+            sum(len(guild._channels) for guild in guilds)
+        ),
+        "members": estimate(
+            (member for guild in guilds for member in guild._members.values()),
+            sum(len(guild._members) for guild in guilds)
+        ),
+        "users": estimate(bot.users, len(bot.users)),
+        "emojis": estimate(bot.emojis, len(bot.emojis)),
+        "stickers": estimate(bot.stickers, len(bot.stickers)),
+    }
+    for name, read in (extra or {}).items():
+        report[name] = read()
+    return report
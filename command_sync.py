@@ -0,0 +1,24 @@
+import hashlib
+import json
+from persistence import load_json, atomic_write_json, run_io
+import config
+
+def tree_hash(tree, application_id):
+    """Stable hash of the global command payload that tree.sync() would upload"""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands()),
+        key=lambda command: (command.get("type", 1), command["name"])
+    )
+    data = json.dumps({"application_id": application_id, "commands": payload}, sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+async def sync_commands(bot, force=False):
+    """Sync the command tree only if it changed since the last sync, returns the synced commands or None"""
+    digest = tree_hash(bot.tree, bot.application_id)
+    stored = await run_io(load_json, config.TREE_HASH_PATH, {})
+    if not force and stored.get("hash") == digest:
+        return None
+    
+    synced = await bot.tree.sync()
+    await run_io(atomic_write_json, config.TREE_HASH_PATH, {"hash": digest})
+    return synced
@@ -0,0 +1,54 @@
+import os
+
+# Directory holding the bot's state, each shard worker gets its own
+DATA_DIR = os.getenv('DATA_DIR', '.')
+
+# Storage backend: "sqlite" (default) or "json" for the legacy flat files
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite')
+SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(DATA_DIR, 'bot.db'))
+
+# Message ID -> author ID entries kept for resolving AFK reply targets
+REPLY_AUTHOR_CACHE_SIZE = int(os.getenv('REPLY_AUTHOR_CACHE_SIZE', '5000'))
+
+# Seconds before the same AFK user is announced again in the same channel
+AFK_NOTIFY_COOLDOWN = float(os.getenv('AFK_NOTIFY_COOLDOWN', '30'))
+
+# Recent messages whose content is kept for sniping deletes discord.py didn't cache (0 disables)
+SNIPE_CONTENT_CACHE_SIZE = int(os.getenv('SNIPE_CONTENT_CACHE_SIZE', '5000'))
+
+# Lockdown: permission edits in flight at once, and edits started per second
+LOCKDOWN_CONCURRENCY = int(os.getenv('LOCKDOWN_CONCURRENCY', '5'))
+LOCKDOWN_RATE = float(os.getenv('LOCKDOWN_RATE', '5'))
+
+# Hash of the last synced command tree, so unchanged trees aren't re-synced on every connect
+TREE_HASH_PATH = os.getenv('TREE_HASH_PATH', os.path.join(DATA_DIR, 'command_tree_hash.json'))
+
+# Deleted messages kept per channel, and seconds before they expire (0 keeps them until evicted)
+SNIPE_HISTORY_SIZE = int(os.getenv('SNIPE_HISTORY_SIZE', '1000'))
+SNIPE_HISTORY_TTL = float(os.getenv('SNIPE_HISTORY_TTL', str(7 * 86400)))
+
+# Approximate bytes of snipe history held in memory across all channels before cold channels are dropped
+SNIPE_MEMORY_BUDGET = int(os.getenv('SNIPE_MEMORY_BUDGET', str(64 * 1024 * 1024)))
+
+# Snipe pagers: seconds of inactivity before the buttons go away, and most pagers live at once
+SNIPE_PAGER_TIMEOUT = float(os.getenv('SNIPE_PAGER_TIMEOUT', '120'))
+SNIPE_PAGER_MAX_VIEWS = int(os.getenv('SNIPE_PAGER_MAX_VIEWS', '50'))
+
+# Queued AFK notifications kept per channel before the oldest are dropped
+OUTBOUND_MAX_NOTICES = int(os.getenv('OUTBOUND_MAX_NOTICES', '50'))
+
+# Prometheus metrics endpoint, served on METRICS_HOST:METRICS_PORT/metrics (0 disables it)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Sharding: total shard count (0 runs unsharded) and the shards this process runs, e.g. "0-3" (empty runs all)
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))
+SHARD_IDS = os.getenv('SHARD_IDS', '')
+
+# Client caches: "default" keeps discord.py's defaults, "lean" keeps only what the bot's features use.
+# The others override one setting of the profile when set.
+CACHE_PROFILE = os.getenv('CACHE_PROFILE', 'default')
+MESSAGE_CACHE_SIZE = os.getenv('MESSAGE_CACHE_SIZE', '')
+# "none", "from_intents" or flag names such as "joined,voice"
+MEMBER_CACHE_FLAGS = os.getenv('MEMBER_CACHE_FLAGS', '')
+CHUNK_GUILDS_AT_STARTUP = os.getenv('CHUNK_GUILDS_AT_STARTUP', '')
@@ -0,0 +1,61 @@
+import json
+import os
+import time
+
+# How often to stat emojis.json for changes, in seconds
+RELOAD_CHECK_INTERVAL = 5.0
+
+class EmojiRegistry:
+    """Custom emojis from emojis.json, rendered once and reloaded only when the file changes"""
+
+    def __init__(self, path='emojis.json'):
+        self.path = path
+        self.ids = {}
+        self.rendered = {}
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def load(self):
+        """Parse the file and pre-render every emoji string"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+            with open(self.path, 'r') as f:
+                ids = json.load(f)['emojis']
+        except FileNotFoundError:
+            mtime, ids = None, {}
+        except (ValueError, KeyError) as e:
+            # Keep the previous emojis if the file is mid-edit or malformed
+            print(f"Error loading emojis: {e}")
+            return
+        self.ids = ids
+        self.rendered = {name: f"<:custom:{emoji_id}>" for name, emoji_id in ids.items() if emoji_id}
+        self._mtime = mtime
+        self._checked_at = time.monotonic()
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if now - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            self.load()
+
+    def get(self, name, fallback):
+        """Rendered custom emoji, or fallback if it isn't configured"""
+        self._reload_if_changed()
+        return self.rendered.get(name, fallback)
+
+    def get_id(self, name):
+        """Raw emoji ID, or None if it isn't configured"""
+        self._reload_if_changed()
+        return self.ids.get(name)
+
+registry = EmojiRegistry()
+
+def get_emoji(name, fallback):
+    """Rendered custom emoji from the shared registry, or fallback"""
+    return registry.get(name, fallback)
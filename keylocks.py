@@ -0,0 +1,30 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+class KeyedLocks:
+    """One asyncio.Lock per key, created on demand and dropped once nobody holds or waits on it.
+
+    Unrelated keys never wait on each other, so e.g. locking one channel doesn't
+    hold up commands in any other channel.
+    """
+
+    def __init__(self):
+        # key -> [lock, number of holders and waiters]
+        self._locks = {}
+
+    def __len__(self):
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def __call__(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
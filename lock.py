@@ -1,50 +1,258 @@
+import asyncio
 import discord
-import json
+import re
+import time
+from emoji_registry import get_emoji
+from storage import async_storage
+from ratelimit import RateLimiter, run_bounded
+from timers import TimerScheduler
+from keylocks import KeyedLocks
+from outbound import outbound
+from metrics import metrics
+import config
 
-def load_locks():
-    """Load lock configuration from lock.json"""
-    try:
-        with open('lock.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {"locked_channels": {}}
-
-def save_locks(locks):
-    """Save lock configuration to lock.json"""
-    with open('lock.json', 'w') as f:
-        json.dump(locks, f, indent=2)
-
-def load_emojis():
-    """Load emojis from emojis.json"""
-    try:
-        with open('emojis.json', 'r') as f:
-            data = json.load(f)
-            return data['emojis']
-    except FileNotFoundError:
-        return {}
+# Seconds between edits of the lockdown progress embed
+LOCKDOWN_PROGRESS_INTERVAL = 2.0
 
 async def send_error_embed(ctx, emoji_name, title):
     """Send error embed in the specified style with custom emoji"""
-    emojis = load_emojis()
-    emoji_id = emojis.get(emoji_name)
-    
-    # Create emoji string from ID
-    emoji_str = f"<:custom:{emoji_id}>" if emoji_id else "❌"
+    emoji_str = get_emoji(emoji_name, "❌")
     
     embed = discord.Embed(
         description=f"{emoji_str} {ctx.author.mention}: {title}",
         color=discord.Color.yellow()
     )
     embed.set_footer(text="")
-    await ctx.send(embed=embed)
+    await outbound.reply(ctx.channel, embed)
+
+class LockIndex:
+    """Locked channels per guild, kept in memory and written through to storage"""
+
+    def __init__(self):
+        # guild ID -> {channel ID -> lock info}
+        self.guilds = {}
+        # channel ID -> guild ID, for removing a lock by channel alone
+        self._guild_of = {}
+
+    async def load(self):
+        """Load locks from storage, called once at startup"""
+        self.guilds = {}
+        self._guild_of = {}
+        for channel_id, info in (await async_storage.load_locks()).items():
+            self._put(int(channel_id), info)
+
+    def _put(self, channel_id, info):
+        guild_id = int(info["guild_id"])
+        self.guilds.setdefault(guild_id, {})[channel_id] = info
+        self._guild_of[channel_id] = guild_id
+
+    def get(self, guild_id, channel_id):
+        return self.guilds.get(guild_id, {}).get(channel_id)
+
+    def get_by_channel(self, channel_id):
+        return self.get(self._guild_of.get(channel_id), channel_id)
+
+    def guild_locks(self, guild_id):
+        """{channel ID: lock info} for one guild"""
+        return self.guilds.get(guild_id, {})
+
+    def items(self):
+        """(channel ID, lock info) for every lock"""
+        for locks in self.guilds.values():
+            yield from locks.items()
+
+    async def update(self, upserts, deletes=()):
+        """Apply {channel ID: info} upserts and channel ID deletes, then persist them in one write"""
+        for channel_id, info in upserts.items():
+            self._put(channel_id, info)
+        for channel_id in deletes:
+            guild_id = self._guild_of.pop(channel_id, None)
+            locks = self.guilds.get(guild_id)
+            if locks is not None:
+                locks.pop(channel_id, None)
+                if not locks:
+                    del self.guilds[guild_id]
+        await async_storage.write_locks(
+            {str(channel_id): info for channel_id, info in upserts.items()},
+            [str(channel_id) for channel_id in deletes]
+        )
+
+lock_index = LockIndex()
+
+# Serialise lock/unlock on the same channel, and lockdowns in the same guild
+channel_locks = KeyedLocks()
+guild_locks = KeyedLocks()
+
+async def _reconcile_guild(guild):
+    """(found, missing) channel IDs where the guild's overwrites disagree with the index.
+
+    missing holds indexed channels that were deleted or are no longer denied send_messages.
+    """
+    everyone_role = guild.default_role
+    actual = set()
+    for position, channel in enumerate(guild.text_channels):
+        if channel.overwrites_for(everyone_role).send_messages is False:
+            actual.add(channel.id)
+        # Let other guilds and events in between on very large guilds
+        if position % 500 == 499:
+            await asyncio.sleep(0)
+    known = set(lock_index.guild_locks(guild.id))
+    return actual - known, known - actual
+
+async def reconcile_locks(bot):
+    """Bring the lock index in line with the actual @everyone overwrites of cached channels.
+
+    Guilds that are unavailable (e.g. during an outage) have no channels loaded, so
+    their locks are left as they are rather than treated as gone.
+    """
+    guilds = [guild for guild in bot.guilds if not guild.unavailable]
+    unavailable = len(bot.guilds) - len(guilds)
+    results = await asyncio.gather(*(_reconcile_guild(guild) for guild in guilds))
+    
+    upserts = {}
+    deletes = []
+    for guild, (found, missing) in zip(guilds, results):
+        for channel_id in found:
+            channel = guild.get_channel(channel_id)
+            upserts[channel_id] = {
+                "channel_name": channel.name,
+                "locked_by": "unknown (found on startup)",
+                "guild_id": guild.id,
+                # Possibly read-only on purpose (rules, announcements), so unlockdown leaves it alone
+                "source": "reconciled"
+            }
+        deletes.extend(missing)
+        if found or missing:
+            print(f"Lock reconciliation for {guild.name} ({guild.id}): "
+                  f"{len(found)} locked outside the bot, {len(missing)} no longer locked")
+    
+    if upserts or deletes:
+        await lock_index.update(upserts, deletes)
+        if lock_timers is not None:
+            for channel_id in deletes:
+                lock_timers.cancel(channel_id)
+    print(f"Lock reconciliation: {len(guilds)} guilds checked, {unavailable} unavailable skipped, "
+          f"{len(upserts)} locks added, {len(deletes)} removed")
+    return upserts, deletes
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+DURATION_PATTERN = re.compile(r"(\d+)([smhd])")
+
+def parse_duration(text):
+    """Seconds in a duration like 10m, 2h or 1h30m, or None if it isn't one"""
+    text = text.lower()
+    parts = DURATION_PATTERN.findall(text)
+    if not parts or "".join(number + unit for number, unit in parts) != text:
+        return None
+    return sum(int(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+# Seconds before retrying a timed lock whose unlock failed, doubling per failure up to the max
+EXPIRE_RETRY_DELAY = 60.0
+EXPIRE_RETRY_MAX = 3600.0
+# channel ID -> failed unlock attempts in a row
+_expire_failures = {}
 
-async def lock_channel(ctx, target_channel=None):
-    """Lock a channel - prevents members from sending messages"""
+async def _expire_locks(bot, channel_ids):
+    """Unlock every channel whose timed lock ran out, in one batch"""
+    now = time.time()
+    expired = []
+    for channel_id in channel_ids:
+        info = lock_index.get_by_channel(channel_id)
+        if info is not None and info.get("expires_at", now + 1) <= now:
+            expired.append(channel_id)
+    channels = []
+    # Channels missing from the cache because their guild is unavailable or not loaded yet
+    unreachable = set()
+    for channel_id in expired:
+        channel = bot.get_channel(channel_id)
+        if channel is not None:
+            channels.append(channel)
+            continue
+        guild = bot.get_guild(int(lock_index.get_by_channel(channel_id)["guild_id"]))
+        if guild is None or guild.unavailable:
+            unreachable.add(channel_id)
+    
+    # Channels unlocked or re-locked by a command while we waited for their lock
+    superseded = set()
+    
+    async def unlock(channel):
+        async with channel_locks(channel.id):
+            info = lock_index.get_by_channel(channel.id)
+            if info is None or info.get("expires_at", now + 1) > now:
+                superseded.add(channel.id)
+                return
+            await channel.set_permissions(
+                channel.guild.default_role,
+                send_messages=True,
+                reason="Timed lock expired"
+            )
+    
+    limiter = RateLimiter(config.LOCKDOWN_RATE, burst=config.LOCKDOWN_CONCURRENCY)
+    results = await run_bounded(channels, unlock, config.LOCKDOWN_CONCURRENCY, limiter)
+    for channel, error in results:
+        if error is not None:
+            print(f"Error unlocking expired lock in {channel.id}: {error}")
+            metrics.count_error("event", "lock_expiry")
+    
+    # Channels deleted from an available guild are forgotten too, failed unlocks stay locked
+    failed = {channel.id for channel, error in results if error is not None} | unreachable
+    done = [channel_id for channel_id in expired if channel_id not in failed and channel_id not in superseded]
+    for channel_id in channel_ids:
+        if channel_id not in failed:
+            _expire_failures.pop(channel_id, None)
+    if done:
+        await lock_index.update({}, done)
+    
+    # The scheduler already dropped these timers, so try again later with a backoff
+    if unreachable:
+        print(f"Postponing {len(unreachable)} expired lock(s) in unavailable guilds")
+    for channel_id in failed:
+        attempts = _expire_failures.get(channel_id, 0) + 1
+        _expire_failures[channel_id] = attempts
+        delay = min(EXPIRE_RETRY_DELAY * 2 ** (attempts - 1), EXPIRE_RETRY_MAX)
+        if lock_timers is not None:
+            lock_timers.schedule(channel_id, time.time() + delay)
+
+lock_timers = None
+
+async def start_lock_timers(bot):
+    """Schedule every stored timed lock, overdue ones run together straight away"""
+    global lock_timers
+    if lock_timers is not None:
+        return
+    lock_timers = TimerScheduler(lambda channel_ids: _expire_locks(bot, channel_ids))
+    for channel_id, info in lock_index.items():
+        if info.get("expires_at") is not None:
+            lock_timers.schedule(channel_id, info["expires_at"])
+    lock_timers.start()
+
+def stop_lock_timers():
+    if lock_timers is not None:
+        lock_timers.stop()
+
+def _format_duration(seconds):
+    parts = []
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60), ("s", 1)):
+        if seconds >= size:
+            parts.append(f"{seconds // size}{unit}")
+            seconds %= size
+    return "".join(parts)
+
+async def lock_channel(ctx, target_channel=None, duration_text=None):
+    """Lock a channel - prevents members from sending messages, optionally for a duration like 1h30m"""
     # Check if user has manage_channels permission
     if not ctx.author.guild_permissions.manage_channels:
         await send_error_embed(ctx, "warn", "You're **missing** permission: `manage_channels`")
         return
     
+    # Reject anything that isn't entirely a duration rather than quietly locking for good
+    duration = None
+    if duration_text is not None:
+        duration = parse_duration("".join(duration_text.split()))
+        if not duration:
+            await send_error_embed(ctx, "deny", f"Invalid duration `{duration_text}`, use something like `10m` or `1h30m`")
+            return
+    
     try:
         channel = target_channel if target_channel else ctx.channel
         guild = channel.guild
@@ -54,47 +262,60 @@ async def lock_channel(ctx, target_channel=None):
             await send_error_embed(ctx, "warn", "I'm **missing** permission: `manage_channels`")
             return
         
-        # Check if channel is already locked
-        locks = load_locks()
-        is_already_locked = str(channel.id) in locks["locked_channels"]
-        
-        # Get @everyone role
-        everyone_role = guild.default_role
-        
-        # Only lock if not already locked
-        if not is_already_locked:
-            await channel.set_permissions(
-                everyone_role,
-                send_messages=False,
-                reason=f"Channel locked by {ctx.author}"
-            )
-            
-            # Save lock state to lock.json
-            locks["locked_channels"][str(channel.id)] = {
-                "channel_name": channel.name,
-                "locked_by": str(ctx.author),
-                "guild_id": guild.id
-            }
-            save_locks(locks)
+        # Hold the channel's lock so concurrent lock/unlock commands can't interleave
+        async with channel_locks(channel.id):
+            # Check if channel is already locked
+            is_already_locked = lock_index.get(guild.id, channel.id) is not None
             
-            # React with lock emoji only (first lock)
-            await ctx.message.add_reaction('🔒')
-        else:
-            # Channel already locked - send embed
-            emojis = load_emojis()
-            deny_emoji_id = emojis.get("deny")
-            deny_emoji = f"<:custom:{deny_emoji_id}>" if deny_emoji_id else "❌"
+            # Get @everyone role
+            everyone_role = guild.default_role
             
-            embed = discord.Embed(
-                description=f"{deny_emoji} {ctx.author.mention}: {channel.mention} is already locked",
-                color=discord.Color.red()
-            )
-            await ctx.send(embed=embed)
+            # Only lock if not already locked
+            if not is_already_locked:
+                await channel.set_permissions(
+                    everyone_role,
+                    send_messages=False,
+                    reason=f"Channel locked by {ctx.author}"
+                )
+                
+                # Save lock state, timed locks keep their expiry so it survives restarts
+                lock_info = {
+                    "channel_name": channel.name,
+                    "locked_by": str(ctx.author),
+                    "guild_id": guild.id
+                }
+                if duration:
+                    lock_info["expires_at"] = time.time() + duration
+                await lock_index.update({channel.id: lock_info})
+                
+                if duration:
+                    if lock_timers is not None:
+                        lock_timers.schedule(channel.id, lock_info["expires_at"])
+                    approve_emoji = get_emoji("approve", "✅")
+                    embed = discord.Embed(
+                        description=f"{approve_emoji} {ctx.author.mention}: {channel.mention} locked for **{_format_duration(duration)}**",
+                        color=discord.Color.green()
+                    )
+                    await outbound.reply(ctx.channel, embed)
+                else:
+                    # React with lock emoji only (first lock)
+                    await ctx.message.add_reaction('🔒')
+            else:
+                # Channel already locked - send embed
+                deny_emoji = get_emoji("deny", "❌")
+                
+                embed = discord.Embed(
+                    description=f"{deny_emoji} {ctx.author.mention}: {channel.mention} is already locked",
+                    color=discord.Color.red()
+                )
+                await outbound.reply(ctx.channel, embed)
         
     except discord.Forbidden:
+        metrics.count_error("command", "lock")
         await send_error_embed(ctx, "warn", "I'm **missing** permission: `manage_channels`")
     except Exception as e:
         print(f"Error locking channel: {e}")
+        metrics.count_error("command", "lock")
         await send_error_embed(ctx, "warn", f"An error occurred: {str(e)}")
 
 async def unlock_channel(ctx, target_channel=None):
@@ -113,41 +334,229 @@ async def unlock_channel(ctx, target_channel=None):
             await send_error_embed(ctx, "warn", "I'm **missing** permission: `manage_channels`")
             return
         
-        # Check if channel is actually locked
-        locks = load_locks()
-        is_locked = str(channel.id) in locks["locked_channels"]
-        
-        # Get @everyone role
-        everyone_role = guild.default_role
+        # Hold the channel's lock so concurrent lock/unlock commands can't interleave
+        async with channel_locks(channel.id):
+            # Check if channel is actually locked
+            is_locked = lock_index.get(guild.id, channel.id) is not None
+            
+            # Get @everyone role
+            everyone_role = guild.default_role
+            
+            # Only unlock if currently locked
+            if is_locked:
+                await channel.set_permissions(
+                    everyone_role,
+                    send_messages=True,
+                    reason=f"Channel unlocked by {ctx.author}"
+                )
+                
+                # Remove lock state
+                await lock_index.update({}, [channel.id])
+                if lock_timers is not None:
+                    lock_timers.cancel(channel.id)
+                
+                # React with unlock emoji only (first unlock)
+                await ctx.message.add_reaction('🔓')
+            else:
+                # Channel already unlocked - send embed
+                deny_emoji = get_emoji("deny", "❌")
+                
+                embed = discord.Embed(
+                    description=f"{deny_emoji} {ctx.author.mention}: {channel.mention} is already unlocked",
+                    color=discord.Color.red()
+                )
+                await outbound.reply(ctx.channel, embed)
         
-        # Only unlock if currently locked
-        if is_locked:
+    except discord.Forbidden:
+        metrics.count_error("command", "unlock")
+        await send_error_embed(ctx, "warn", "I'm **missing** permission: `manage_channels`")
+    except Exception as e:
+        print(f"Error unlocking channel: {e}")
+        metrics.count_error("command", "unlock")
+        await send_error_embed(ctx, "warn", f"An error occurred: {str(e)}")
+
+async def _set_send_messages_bulk(ctx, channels, send_messages, verb, reason, still_wanted):
+    """Flip @everyone's send_messages on many channels concurrently, editing one progress embed.
+
+    still_wanted(channel) re-checks the lock index under the channel's lock, so channels
+    a lock or unlock command changed in the meantime are left to that command. Returns
+    (progress message, succeeded channels, failed list of (channel, exception), unchanged
+    channels), with succeeded still wanted on return so the caller can record them.
+    """
+    everyone_role = ctx.guild.default_role
+    unchanged = set()
+    progress = await outbound.reply(ctx.channel, discord.Embed(
+        description=f"⏳ {ctx.author.mention}: {verb} {len(channels)} channels...",
+        color=discord.Color.from_rgb(79, 84, 92)
+    ))
+    last_edit = time.monotonic()
+    
+    async def update_channel(channel):
+        async with channel_locks(channel.id):
+            # Re-check under the channel's lock, like the timers do
+            if not still_wanted(channel):
+                unchanged.add(channel.id)
+                return
             await channel.set_permissions(
                 everyone_role,
-                send_messages=True,
-                reason=f"Channel unlocked by {ctx.author}"
+                send_messages=send_messages,
+                reason=reason
             )
+    
+    async def report_progress(finished):
+        # Edit the progress embed at most every couple of seconds
+        nonlocal last_edit
+        now = time.monotonic()
+        if finished < len(channels) and now - last_edit >= LOCKDOWN_PROGRESS_INTERVAL:
+            last_edit = now
+            # Best effort, e.g. a mod may have deleted the progress message
+            try:
+                await progress.edit(embed=discord.Embed(
+                    description=f"⏳ {ctx.author.mention}: {verb} channels... {finished}/{len(channels)}",
+                    color=discord.Color.from_rgb(79, 84, 92)
+                ))
+            except discord.HTTPException:
+                pass
+    
+    limiter = RateLimiter(config.LOCKDOWN_RATE, burst=config.LOCKDOWN_CONCURRENCY)
+    results = await run_bounded(channels, update_channel, config.LOCKDOWN_CONCURRENCY, limiter, report_progress)
+    # A command may also have taken a channel over after it was updated
+    for channel, error in results:
+        if error is None and not still_wanted(channel):
+            unchanged.add(channel.id)
+    succeeded = [channel for channel, error in results if error is None and channel.id not in unchanged]
+    failed = [(channel, error) for channel, error in results if error is not None]
+    return progress, succeeded, failed, [channel for channel in channels if channel.id in unchanged]
+
+def _lockdown_summary(ctx, done_verb, succeeded, failed, skipped, reconciled=0):
+    """Summary embed for a lockdown or unlockdown"""
+    emoji = get_emoji("approve", "✅") if not failed else get_emoji("warn", "⚠️")
+    lines = [f"{emoji} {ctx.author.mention}: {done_verb} **{len(succeeded)}** channel{'s' if len(succeeded) != 1 else ''}"]
+    if skipped:
+        lines.append(f"Skipped **{skipped}** already {done_verb.lower()}")
+    if reconciled:
+        lines.append(f"Left **{reconciled}** locked outside the bot as they were, use `unlockdown all` to include them")
+    if failed:
+        lines.append(f"Failed on **{len(failed)}**:")
+        for channel, error in failed[:10]:
+            reason = "missing permissions" if isinstance(error, discord.Forbidden) else str(error)
+            lines.append(f"• {channel.mention}: {reason}")
+        if len(failed) > 10:
+            lines.append(f"• ...and {len(failed) - 10} more")
+    return discord.Embed(
+        description="\n".join(lines),
+        color=discord.Color.green() if not failed else discord.Color.yellow()
+    )
+
+async def lockdown(ctx, category=None):
+    """Lock every text channel in the server, or in one category"""
+    # Check if user has manage_channels permission
+    if not ctx.author.guild_permissions.manage_channels:
+        await send_error_embed(ctx, "warn", "You're **missing** permission: `manage_channels`")
+        return
+    
+    guild = ctx.guild
+    if not guild.me.guild_permissions.manage_channels:
+        await send_error_embed(ctx, "warn", "I'm **missing** permission: `manage_channels`")
+        return
+    
+    try:
+        # One lockdown or unlockdown at a time per guild
+        async with guild_locks(guild.id):
+            channels = category.text_channels if category else guild.text_channels
+            locks = lock_index.guild_locks(guild.id)
+            targets = [channel for channel in channels if channel.id not in locks]
+            skipped = len(channels) - len(targets)
             
-            # Remove lock state from lock.json
-            del locks["locked_channels"][str(channel.id)]
-            save_locks(locks)
-            
-            # React with unlock emoji only (first unlock)
-            await ctx.message.add_reaction('🔓')
-        else:
-            # Channel already unlocked - send embed
-            emojis = load_emojis()
-            deny_emoji_id = emojis.get("deny")
-            deny_emoji = f"<:custom:{deny_emoji_id}>" if deny_emoji_id else "❌"
+            if not targets:
+                await send_error_embed(ctx, "deny", "Every channel is already locked")
+                return
             
-            embed = discord.Embed(
-                description=f"{deny_emoji} {ctx.author.mention}: {channel.mention} is already unlocked",
-                color=discord.Color.red()
+            # Channels a lock command locked in the meantime keep that command's entry and expiry
+            progress, succeeded, failed, unchanged = await _set_send_messages_bulk(
+                ctx, targets, False, "Locking", f"Lockdown by {ctx.author}",
+                lambda channel: lock_index.get(guild.id, channel.id) is None
             )
-            await ctx.send(embed=embed)
+            skipped += len(unchanged)
+            
+            # Record every newly locked channel in one write
+            if succeeded:
+                await lock_index.update({
+                    channel.id: {
+                        "channel_name": channel.name,
+                        "locked_by": str(ctx.author),
+                        "guild_id": guild.id
+                    }
+                    for channel in succeeded
+                })
+            
+            await progress.edit(embed=_lockdown_summary(ctx, "Locked", succeeded, failed, skipped))
         
-    except discord.Forbidden:
+    except Exception as e:
+        print(f"Error during lockdown: {e}")
+        metrics.count_error("command", "lockdown")
+        await send_error_embed(ctx, "warn", f"An error occurred: {str(e)}")
+
+def _is_reconciled(info):
+    return info.get("source") == "reconciled"
+
+async def unlockdown(ctx, category=None, include_reconciled=False):
+    """Unlock every locked text channel in the server, or in one category.
+
+    Channels that were found locked on startup rather than locked by the bot are
+    only unlocked with include_reconciled, since they may be read-only on purpose.
+    """
+    # Check if user has manage_channels permission
+    if not ctx.author.guild_permissions.manage_channels:
+        await send_error_embed(ctx, "warn", "You're **missing** permission: `manage_channels`")
+        return
+    
+    guild = ctx.guild
+    if not guild.me.guild_permissions.manage_channels:
         await send_error_embed(ctx, "warn", "I'm **missing** permission: `manage_channels`")
+        return
+    
+    try:
+        # One lockdown or unlockdown at a time per guild
+        async with guild_locks(guild.id):
+            channels = category.text_channels if category else guild.text_channels
+            locks = lock_index.guild_locks(guild.id)
+            locked = [channel for channel in channels if channel.id in locks]
+            targets = [
+                channel for channel in locked
+                if include_reconciled or not _is_reconciled(locks[channel.id])
+            ]
+            reconciled = len(locked) - len(targets)
+            skipped = len(channels) - len(locked)
+            
+            if not targets:
+                if reconciled:
+                    await send_error_embed(
+                        ctx, "deny",
+                        f"Only **{reconciled}** channel(s) locked outside the bot remain, use `unlockdown all` to unlock them"
+                    )
+                else:
+                    await send_error_embed(ctx, "deny", "No locked channels to unlock")
+                return
+            
+            # Channels unlocked or re-locked by a command in the meantime are left to it
+            targeted = {channel.id: locks[channel.id] for channel in targets}
+            progress, succeeded, failed, unchanged = await _set_send_messages_bulk(
+                ctx, targets, True, "Unlocking", f"Lockdown lifted by {ctx.author}",
+                lambda channel: lock_index.get(guild.id, channel.id) is targeted[channel.id]
+            )
+            skipped += len(unchanged)
+            
+            # Drop every unlocked channel in one write
+            if succeeded:
+                await lock_index.update({}, [channel.id for channel in succeeded])
+                if lock_timers is not None:
+                    for channel in succeeded:
+                        lock_timers.cancel(channel.id)
+            
+            await progress.edit(embed=_lockdown_summary(ctx, "Unlocked", succeeded, failed, skipped, reconciled))
+        
     except Exception as e:
-        print(f"Error unlocking channel: {e}")
+        print(f"Error during unlockdown: {e}")
+        metrics.count_error("command", "unlockdown")
         await send_error_embed(ctx, "warn", f"An error occurred: {str(e)}")
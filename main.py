@@ -1,76 +1,281 @@
 import discord
 from discord.ext import commands
-from typing import Optional
-import json
+from typing import Literal, Optional
+import argparse
+import math
 import os
-from lock import lock_channel, unlock_channel
-from afk import afk_command, handle_message
-from snipe import snipe_command, clearsnipe_command, track_message_delete
+import time
+from lock import (
+    lock_channel, unlock_channel, lockdown, unlockdown, lock_index,
+    reconcile_locks, start_lock_timers, stop_lock_timers
+)
+from afk import afk_command, handle_message, is_afk_relevant, afk_store, reply_authors
+from snipe import (
+    snipe_command, snipe_search_command, clearsnipe_command, remember_message,
+    track_raw_message_delete, track_raw_bulk_message_delete, snipe_store, content_cache
+)
+from storage import async_storage
+from persistence import shutdown_io
+from emoji_registry import registry as emoji_registry, get_emoji
+from command_sync import sync_commands
+from outbound import outbound
+from metrics import metrics, lag_sampler, MetricsServer
+from sharding import parse_shard_ids
+from cache_profile import client_options, cache_report, estimate
+import config
 
 # Load emojis from JSON
-with open('emojis.json', 'r') as f:
-    emojis_data = json.load(f)
-    EMOJIS = emojis_data['emojis']
+emoji_registry.load()
 
-# Bot setup with comma prefix
-intents = discord.Intents.default()
-intents.message_content = True
-intents.guilds = True
-intents.guild_messages = True
+# Intents and cache sizes from the configured cache profile
+options = client_options()
 
-bot = commands.Bot(command_prefix=',', intents=intents)
+class BotHooks:
+    """Startup and shutdown shared by the single-process and sharded bots"""
+
+    # Set by --sync to force one command tree sync on the next ready event
+    force_sync = False
+    # The command tree is global, so only one shard worker syncs it
+    syncs_commands = True
+    metrics_server = None
+
+    async def setup_hook(self):
+        # Load persisted state once, before any events arrive
+        await async_storage.open()
+        await afk_store.load()
+        await snipe_store.load()
+        await lock_index.load()
+        lag_sampler.start()
+        if config.METRICS_PORT:
+            try:
+                self.metrics_server = MetricsServer(metrics, config.METRICS_HOST, config.METRICS_PORT)
+                self.metrics_server.start()
+            except OSError as e:
+                self.metrics_server = None
+                print(f"Failed to start metrics server: {e}")
+
+    async def close(self):
+        stop_lock_timers()
+        lag_sampler.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        outbound.close()
+        # Write out anything still waiting on the debounce timer
+        await afk_store.flush()
+        await snipe_store.flush()
+        await super().close()
+        await async_storage.close()
+
+class Bot(BotHooks, commands.Bot):
+    pass
+
+class ShardedBot(BotHooks, commands.AutoShardedBot):
+    pass
+
+def create_bot():
+    """Single connection bot, or a sharded one when SHARD_COUNT is set"""
+    if not config.SHARD_COUNT:
+        return Bot(command_prefix=',', **options)
+    shard_ids = parse_shard_ids(config.SHARD_IDS)
+    sharded = ShardedBot(command_prefix=',', **options, shard_count=config.SHARD_COUNT, shard_ids=shard_ids)
+    sharded.syncs_commands = shard_ids is None or 0 in shard_ids
+    return sharded
+
+bot = create_bot()
+
+metrics.gauge("gateway_latency_seconds", "Heartbeat round trip to the gateway", lambda: bot.latency)
+metrics.gauge("loop_lag_seconds", "How late the last event loop lag sample woke up", lambda: lag_sampler.last)
+metrics.gauge("outbound", "Outbound send queue depths and counters", outbound.stats)
+metrics.gauge("snipe_memory", "Snipe history held in memory", snipe_store.memory_stats)
+metrics.gauge("locked_channels", "Channels currently locked", lambda: sum(map(len, lock_index.guilds.values())))
+metrics.gauge("afk_users", "Users currently AFK", lambda: sum(map(len, afk_store.guilds.values())))
+
+# Caches the bot keeps itself, reported next to discord.py's
+BOT_CACHES = {
+    "snipe_history": lambda: (sum(map(len, snipe_store.channels.values())), snipe_store.bytes),
+    "snipe_content": lambda: estimate(content_cache.items(), len(content_cache)),
+    "reply_authors": lambda: estimate(reply_authors.items(), len(reply_authors)),
+}
+
+# Seconds a cache report is reused, so both cache gauges of one scrape share it
+CACHE_REPORT_TTL = 1.0
+_last_cache_report = (0.0, None)
+
+def _cache_report():
+    global _last_cache_report
+    taken, report = _last_cache_report
+    now = time.monotonic()
+    if report is None or now - taken >= CACHE_REPORT_TTL:
+        report = cache_report(bot, BOT_CACHES)
+        _last_cache_report = (now, report)
+    return report
+
+metrics.gauge("cache_entries", "Entries per cache", lambda: {name: entries for name, (entries, _) in _cache_report().items()})
+metrics.gauge("cache_bytes", "Approximate bytes per cache", lambda: {name: size for name, (_, size) in _cache_report().items()})
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.command_started = time.perf_counter()
+
+@bot.after_invoke
+async def record_command_time(ctx):
+    # Runs even when the command raised, ctx.command_failed tells which
+    started = getattr(ctx, "command_started", None)
+    if started is not None:
+        metrics.observe("command", ctx.command.qualified_name, time.perf_counter() - started, ctx.command_failed)
 
 @bot.event
 async def on_ready():
     print(f'{bot.user} has connected to Discord!')
+    # Both need the channel cache, so they wait for the ready event
+    try:
+        await reconcile_locks(bot)
+    except Exception as e:
+        print(f"Failed to reconcile locks: {e}")
+    await start_lock_timers(bot)
+    if not bot.syncs_commands:
+        return
     try:
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} command(s)")
+        # Skips the REST call when the tree hasn't changed since the last sync
+        synced = await sync_commands(bot, force=bot.force_sync)
+        bot.force_sync = False
+        if synced is None:
+            print("Command tree unchanged, skipped sync")
+        else:
+            print(f"Synced {len(synced)} command(s)")
     except Exception as e:
         print(f"Failed to sync commands: {e}")
 
 @bot.event
 async def on_message(message):
-    await handle_message(message)
+    with metrics.timer("event", "on_message"):
+        remember_message(message)
+        # Most messages don't involve anyone AFK, skip the handler for those
+        if is_afk_relevant(message):
+            await handle_message(message)
     await bot.process_commands(message)
 
+# Raw events fire for every delete, including messages outside the message cache and purges
+@bot.event
+async def on_raw_message_delete(payload):
+    with metrics.timer("event", "on_raw_message_delete"):
+        await track_raw_message_delete(payload)
+
 @bot.event
-async def on_message_delete(message):
-    await track_message_delete(message)
+async def on_raw_bulk_message_delete(payload):
+    with metrics.timer("event", "on_raw_bulk_message_delete"):
+        await track_raw_bulk_message_delete(payload)
 
-@bot.command(name='lock', aliases=['l'], description='Lock a channel')
-async def lock_cmd(ctx, channel: Optional[discord.TextChannel] = None):
-    """Lock a channel - prevents members from sending messages"""
-    await lock_channel(ctx, channel)
+@bot.command(name='lock', aliases=['l'], description='Lock a channel, optionally for a while (e.g. 10m)')
+async def lock_cmd(ctx, channel: Optional[discord.TextChannel] = None, *, duration: Optional[str] = None):
+    """Lock a channel - prevents members from sending messages, until unlocked or the duration runs out"""
+    await lock_channel(ctx, channel, duration)
 
 @bot.command(name='unlock', aliases=['ul'], description='Unlock a channel')
 async def unlock_cmd(ctx, channel: Optional[discord.TextChannel] = None):
     """Unlock a channel - allows members to send messages"""
     await unlock_channel(ctx, channel)
 
+@bot.command(name='lockdown', aliases=['ld'], description='Lock every channel in the server or a category')
+async def lockdown_cmd(ctx, category: Optional[discord.CategoryChannel] = None):
+    """Lock every text channel in the server, or only those in a category"""
+    await lockdown(ctx, category)
+
+@bot.command(name='unlockdown', aliases=['uld'], description='Unlock every locked channel in the server or a category')
+async def unlockdown_cmd(ctx, category: Optional[discord.CategoryChannel] = None, scope: Optional[Literal['all']] = None):
+    """Unlock every locked text channel in the server, or only those in a category.
+    
+    Channels found locked on startup stay locked unless `all` is given.
+    """
+    await unlockdown(ctx, category, include_reconciled=scope == 'all')
+
 @bot.command(name='afk', description='Mark yourself as AFK')
 async def afk_cmd(ctx, *, status=None):
     """Mark user as AFK with optional custom status"""
     await afk_command(ctx, status)
 
-@bot.command(name='snipe', aliases=['s'], description='View deleted messages')
-async def snipe_cmd(ctx, page: int = 1):
-    """View deleted messages in the current channel"""
-    await snipe_command(ctx, page)
+@bot.group(name='snipe', aliases=['s'], invoke_without_command=True, description='View deleted messages')
+async def snipe_cmd(ctx, author: Optional[discord.User] = None, page: int = 1):
+    """View deleted messages in the current channel, optionally only those by one user"""
+    await snipe_command(ctx, page, author)
+
+@snipe_cmd.command(name='search', description='Search deleted messages')
+async def snipe_search_cmd(ctx, *, term: str):
+    """Find deleted messages in the current channel containing every word of term"""
+    await snipe_search_command(ctx, term)
 
 @bot.command(name='clearsnipe', aliases=['cs'], description='Clear all deleted messages')
 async def clearsnipe_cmd(ctx):
     """Clear all deleted messages in the current channel"""
     await clearsnipe_command(ctx)
 
+@bot.command(name='sync', description='Force a command tree sync')
+@commands.is_owner()
+async def sync_cmd(ctx):
+    """Sync application commands even if the tree looks unchanged"""
+    synced = await sync_commands(bot, force=True)
+    embed = discord.Embed(
+        description=f"{get_emoji('approve', '✅')} {ctx.author.mention}: Synced **{len(synced)}** command(s)",
+        color=discord.Color.green()
+    )
+    await outbound.reply(ctx.channel, embed)
+
+def _format_seconds(seconds):
+    if math.isinf(seconds):
+        return ">10s"
+    return f"{seconds * 1000:.0f}ms" if seconds >= 0.01 else f"{seconds * 1000:.1f}ms"
+
+@bot.command(name='stats', description='Show runtime metrics')
+@commands.is_owner()
+async def stats_cmd(ctx):
+    """Latency, error counts and queue depths since startup"""
+    embed = discord.Embed(title="Stats", color=discord.Color.from_rgb(79, 84, 92))
+    for kind, title in (("event", "Events"), ("command", "Commands"), ("storage", "Storage")):
+        lines = []
+        for (k, name), histogram in sorted(metrics.histograms.items()):
+            if k != kind:
+                continue
+            lines.append(
+                f"`{name}` {histogram.count}x · p50 {_format_seconds(histogram.quantile(0.5))}"
+                f" · p99 {_format_seconds(histogram.quantile(0.99))} · {metrics.errors[(k, name)]} errors"
+            )
+        if lines:
+            embed.add_field(name=title, value="\n".join(lines)[:1024], inline=False)
+    
+    queues = outbound.stats()
+    memory = snipe_store.memory_stats()
+    lag = metrics.histograms.get(("loop", "lag"))
+    embed.add_field(name="Runtime", value=(
+        f"Gateway latency: **{_format_seconds(bot.latency) if math.isfinite(bot.latency) else 'n/a'}**\n"
+        f"Loop lag: **{_format_seconds(lag_sampler.last)}** (p99 {_format_seconds(lag.quantile(0.99) if lag else 0.0)})\n"
+        f"Send queues: **{queues['queued_replies']}** replies, **{queues['queued_notices']}** notices"
+        f" in {queues['channels']} channel(s)\n"
+        f"Snipe memory: **{memory['bytes'] // 1024} KiB** across {memory['channels']} channel(s)"
+    ), inline=False)
+    
+    lines = [
+        f"`{name}` {entries:,} · ~{size // 1024:,} KiB"
+        for name, (entries, size) in _cache_report().items() if entries
+    ]
+    embed.add_field(name=f"Caches ({config.CACHE_PROFILE})", value="\n".join(lines) or "Empty", inline=False)
+    await outbound.reply(ctx.channel, embed)
+
 def main():
+    parser = argparse.ArgumentParser(description='Run the bot')
+    parser.add_argument('--sync', action='store_true', help='force a command tree sync on startup')
+    args = parser.parse_args()
+    bot.force_sync = args.sync
+    
     # Get bot token from environment variable
     token = os.getenv('DISCORD_BOT_TOKEN')
     if not token:
         print("Error: DISCORD_BOT_TOKEN environment variable not set")
         return
     
-    bot.run(token)
+    try:
+        bot.run(token)
+    finally:
+        shutdown_io()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,228 @@
+import asyncio
+import bisect
+import concurrent.futures
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Seconds between event loop lag samples
+LAG_SAMPLE_INTERVAL = 1.0
+
+# Help text per histogram family
+FAMILIES = {
+    "event": "Time spent handling gateway events",
+    "command": "Time spent running commands",
+    "storage": "Time spent on storage calls, including waiting for the I/O thread",
+    "loop": "How late event loop lag samples woke up",
+}
+
+class Histogram:
+    """Counts of observations per latency bucket, plus their sum"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # Last slot counts observations above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile, inf if it's past the last one"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+class _Timer:
+    __slots__ = ('metrics', 'kind', 'name', 'started')
+
+    def __init__(self, metrics, kind, name):
+        self.metrics = metrics
+        self.kind = kind
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.kind, self.name, time.perf_counter() - self.started, exc_type is not None)
+        return False
+
+class Metrics:
+    """Latency histograms and error counts per (kind, name), plus gauges read on demand.
+
+    kind is the family ("event", "command", "storage"), name the handler within it.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.errors = {}
+        # name -> (help text, callable returning a number or a {label: number} dict)
+        self.gauges = {}
+
+    def timer(self, kind, name):
+        """Context manager timing a block, errors are counted when it raises"""
+        return _Timer(self, kind, name)
+
+    def observe(self, kind, name, seconds, error=False):
+        key = (kind, name)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+            self.errors[key] = 0
+        histogram.observe(seconds)
+        if error:
+            self.errors[key] += 1
+
+    def count_error(self, kind, name):
+        """Count a failure that was handled where it happened, so it never reached a timer"""
+        key = (kind, name)
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def gauge(self, name, help_text, read):
+        self.gauges[name] = (help_text, read)
+
+    def read_gauges(self):
+        """Current value of every gauge, gauges that fail to read are left out"""
+        values = {}
+        for name, (_, read) in self.gauges.items():
+            try:
+                values[name] = read()
+            except Exception as e:
+                print(f"Error reading gauge {name}: {e}")
+        return values
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        kinds = sorted({kind for kind, _ in self.histograms} | {kind for kind, _ in self.errors})
+        for kind in kinds:
+            metric = f"bot_{kind}_duration_seconds"
+            lines.append(f"# HELP {metric} {FAMILIES.get(kind, f'Time spent per {kind}')}")
+            lines.append(f"# TYPE {metric} histogram")
+            for (k, name), histogram in sorted(self.histograms.items()):
+                if k != kind:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{name="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{name="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{metric}_sum{{name="{name}"}} {histogram.sum}')
+                lines.append(f'{metric}_count{{name="{name}"}} {histogram.count}')
+            metric = f"bot_{kind}_errors_total"
+            lines.append(f"# HELP {metric} Failures per {kind}")
+            lines.append(f"# TYPE {metric} counter")
+            for (k, name), errors in sorted(self.errors.items()):
+                if k == kind:
+                    lines.append(f'{metric}{{name="{name}"}} {errors}')
+
+        values = self.read_gauges()
+        for name, (help_text, _) in sorted(self.gauges.items()):
+            if name not in values:
+                continue
+            metric = f"bot_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            value = values[name]
+            if isinstance(value, dict):
+                for label, number in sorted(value.items()):
+                    lines.append(f'{metric}{{name="{label}"}} {number}')
+            else:
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+class LoopLagSampler:
+    """Measures how late a periodic sleep wakes up, which is how long the loop was blocked"""
+
+    def __init__(self, metrics, interval=LAG_SAMPLE_INTERVAL):
+        self.metrics = metrics
+        self.interval = interval
+        self.last = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, time.perf_counter() - started - self.interval)
+            self.metrics.observe("loop", "lag", self.last)
+
+lag_sampler = LoopLagSampler(metrics)
+
+class MetricsServer:
+    """Serves /metrics from a background thread, rendering on the event loop so nothing is read mid-update"""
+
+    def __init__(self, metrics, host, port):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                result = concurrent.futures.Future()
+
+                def render():
+                    try:
+                        result.set_result(metrics.render())
+                    except Exception as e:
+                        result.set_exception(e)
+
+                loop.call_soon_threadsafe(render)
+                try:
+                    body = result.result(timeout=5).encode()
+                except Exception:
+                    self.send_error(503)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+        print(f"Serving metrics on http://{self.host}:{self._server.server_address[1]}/metrics")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,136 @@
+import asyncio
+from collections import deque
+import config
+
+# Most embeds Discord accepts on one message, and their combined text limit
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+
+class _ChannelQueue:
+    __slots__ = ('channel', 'replies', 'notices', 'task')
+
+    def __init__(self, channel):
+        self.channel = channel
+        # (embed, view, future) for command replies, bare embeds for notifications
+        self.replies = deque()
+        self.notices = deque()
+        self.task = None
+
+    def __len__(self):
+        return len(self.replies) + len(self.notices)
+
+class Outbound:
+    """Per-channel send queues drained by one task each.
+
+    Only one send per channel is in flight, so a burst waits in our queue instead of
+    piling up behind rate limit retries. Command replies always go before queued
+    notifications, and notifications that back up are sent together as one message.
+    """
+
+    def __init__(self, max_notices=config.OUTBOUND_MAX_NOTICES):
+        # Oldest notifications past this many per channel are dropped
+        self.max_notices = max_notices
+        self._queues = {}
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+        self.peak_depth = 0
+
+    def reply(self, channel, embed, view=None):
+        """Queue a command reply, optionally with a view, returns a future for the sent message"""
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queue(channel)
+        queue.replies.append((embed, view, future))
+        self._wake(queue)
+        return future
+
+    def notify(self, channel, embed):
+        """Queue an informational embed, which may be merged with others under backlog"""
+        queue = self._queue(channel)
+        queue.notices.append(embed)
+        if len(queue.notices) > self.max_notices:
+            queue.notices.popleft()
+            self.dropped += 1
+        self._wake(queue)
+
+    def stats(self):
+        """Queue depths and counters"""
+        return {
+            "channels": len(self._queues),
+            "queued_replies": sum(len(queue.replies) for queue in self._queues.values()),
+            "queued_notices": sum(len(queue.notices) for queue in self._queues.values()),
+            "peak_depth": self.peak_depth,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+    def close(self):
+        """Stop every queue, cancelling replies that were never sent"""
+        for queue in list(self._queues.values()):
+            if queue.task is not None:
+                queue.task.cancel()
+            for _, _, future in queue.replies:
+                future.cancel()
+        self._queues.clear()
+
+    def _queue(self, channel):
+        queue = self._queues.get(channel.id)
+        if queue is None:
+            queue = self._queues[channel.id] = _ChannelQueue(channel)
+        return queue
+
+    def _wake(self, queue):
+        self.peak_depth = max(self.peak_depth, len(queue))
+        if queue.task is None:
+            queue.task = asyncio.create_task(self._drain(queue))
+
+    def _take_notices(self, queue):
+        embeds = [queue.notices.popleft()]
+        chars = len(embeds[0])
+        while queue.notices and len(embeds) < MAX_EMBEDS and chars + len(queue.notices[0]) <= MAX_EMBED_CHARS:
+            embed = queue.notices.popleft()
+            embeds.append(embed)
+            chars += len(embed)
+        return embeds
+
+    async def _drain(self, queue):
+        try:
+            while queue:
+                if queue.replies:
+                    embed, view, future = queue.replies.popleft()
+                    if future.cancelled():
+                        continue
+                    try:
+                        if view is None:
+                            message = await queue.channel.send(embed=embed)
+                        else:
+                            message = await queue.channel.send(embed=embed, view=view)
+                    except Exception as e:
+                        self.failed += 1
+                        if not future.done():
+                            future.set_exception(e)
+                    else:
+                        self.sent += 1
+                        if not future.done():
+                            future.set_result(message)
+                    continue
+
+                embeds = self._take_notices(queue)
+                try:
+                    await queue.channel.send(embeds=embeds)
+                except Exception as e:
+                    self.failed += 1
+                    print(f"Error sending notification: {e}")
+                else:
+                    self.sent += 1
+                    self.coalesced += len(embeds) - 1
+        finally:
+            queue.task = None
+            # Nothing can be queued between the loop ending and here, so an empty queue is done
+            if not queue and self._queues.get(queue.channel.id) is queue:
+                del self._queues[queue.channel.id]
+
+outbound = Outbound()
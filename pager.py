@@ -0,0 +1,103 @@
+import asyncio
+from collections import OrderedDict
+import discord
+from emoji_registry import registry
+from outbound import outbound
+
+def _button_emoji(name, fallback):
+    """Custom emoji for a button from emojis.json, or fallback if it isn't configured"""
+    emoji_id = registry.get_id(name)
+    if emoji_id:
+        return discord.PartialEmoji(name=name, id=int(emoji_id))
+    return fallback
+
+class ViewRegistry:
+    """Caps how many pagers are live at once, retiring the oldest when full"""
+
+    def __init__(self, max_views):
+        self.max_views = max_views
+        # Oldest first
+        self._views = OrderedDict()
+
+    def __len__(self):
+        return len(self._views)
+
+    def add(self, view):
+        self._views[view] = None
+        while len(self._views) > self.max_views:
+            oldest, _ = self._views.popitem(last=False)
+            oldest.retire()
+
+    def remove(self, view):
+        self._views.pop(view, None)
+
+class Pager(discord.ui.View):
+    """Previous/next buttons paging through a fixed snapshot of items on one message.
+
+    Each page's embed is rendered the first time it is shown and reused after that,
+    so paging back and forth costs one message edit per press and nothing else.
+    """
+
+    def __init__(self, owner_id, items, render, views, page=1, timeout=120.0):
+        super().__init__(timeout=timeout)
+        self.owner_id = owner_id
+        self.items = items
+        # render(item, page, total_pages) -> Embed
+        self.render = render
+        self.views = views
+        self.page = page
+        self.message = None
+        self._embeds = [None] * len(items)
+        self.previous_button.emoji = _button_emoji("previous", "◀️")
+        self.next_button.emoji = _button_emoji("next", "▶️")
+        self._update_buttons()
+
+    def embed(self):
+        index = self.page - 1
+        if self._embeds[index] is None:
+            self._embeds[index] = self.render(self.items[index], self.page, len(self.items))
+        return self._embeds[index]
+
+    async def start(self, ctx):
+        """Send the current page with the buttons attached"""
+        self.message = await outbound.reply(ctx.channel, self.embed(), view=self)
+        self.views.add(self)
+
+    def retire(self):
+        """Stop listening for presses and strip the buttons, without waiting for the timeout"""
+        self.stop()
+        self.views.remove(self)
+        if self.message is not None:
+            self._strip_task = asyncio.create_task(self._strip_buttons())
+
+    async def _strip_buttons(self):
+        try:
+            await self.message.edit(view=None)
+        except discord.HTTPException:
+            pass
+
+    async def on_timeout(self):
+        self.views.remove(self)
+        if self.message is not None:
+            await self._strip_buttons()
+
+    async def interaction_check(self, interaction):
+        # Only whoever ran the command can page
+        return interaction.user.id == self.owner_id
+
+    def _update_buttons(self):
+        self.previous_button.disabled = self.page <= 1
+        self.next_button.disabled = self.page >= len(self.items)
+
+    async def _show(self, interaction, page):
+        self.page = page
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(style=discord.ButtonStyle.secondary)
+    async def previous_button(self, interaction, button):
+        await self._show(interaction, max(1, self.page - 1))
+
+    @discord.ui.button(style=discord.ButtonStyle.secondary)
+    async def next_button(self, interaction, button):
+        await self._show(interaction, min(len(self.items), self.page + 1))
@@ -0,0 +1,100 @@
+import asyncio
+import functools
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# All blocking storage work runs on this thread, one job at a time, so writes
+# land in the order they were submitted and never stall the event loop
+_io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage-io')
+
+async def run_io(func, *args):
+    """Run a blocking storage call on the I/O thread and wait for the result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, functools.partial(func, *args))
+
+def shutdown_io():
+    """Wait for queued storage work to finish, called once on exit"""
+    _io_executor.shutdown(wait=True)
+
+def load_json(path, default):
+    """Load a JSON file, returning default if it does not exist"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+def atomic_write_json(path, data):
+    """Write JSON to a temp file and rename it over path so readers never see a partial file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+class WriteBehind:
+    """Debounce saves of an in-memory store so a burst of changes costs one write"""
+
+    def __init__(self, save, delay=2.0, max_pending=None):
+        # save is a coroutine function that snapshots the changes and writes them
+        self._save = save
+        self.delay = delay
+        # Save early once this many changes pile up, regardless of the timer
+        self.max_pending = max_pending
+        self.pending = 0
+        self._task = None
+        # Size-triggered flushes in flight, held so they can't be garbage collected mid-save
+        self._flushes = set()
+        self._lock = asyncio.Lock()
+
+    @property
+    def dirty(self):
+        return self.pending > 0
+
+    def mark_dirty(self, count=1):
+        """Record changes and schedule a save after the debounce delay"""
+        self.pending += count
+        if self.max_pending and self.pending >= self.max_pending:
+            self._cancel_timer()
+            task = asyncio.create_task(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._delayed_flush())
+
+    def _cancel_timer(self):
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._task = None
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.delay)
+        self._task = None
+        await self.flush()
+
+    async def flush(self):
+        """Save immediately if there are unsaved changes"""
+        self._cancel_timer()
+        async with self._lock:
+            if not self.pending:
+                return
+            pending = self.pending
+            self.pending = 0
+            try:
+                await self._save()
+            except Exception as e:
+                # Keep the changes counted so the next flush retries them
+                self.pending += pending
+                print(f"Error saving data: {e}")
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+class RateLimiter:
+    """Token bucket allowing `rate` calls per second with bursts of up to `burst`"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a call is allowed"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+async def run_bounded(items, job, concurrency, limiter=None, on_done=None):
+    """Run job(item) for every item with at most `concurrency` in flight, paced by limiter.
+
+    Returns a list of (item, exception or None) in the original order. on_done is
+    called after each job finishes with the number of finished jobs so far, errors
+    it raises are printed and otherwise ignored.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results = [None] * len(items)
+    finished = 0
+
+    async def run(index, item):
+        nonlocal finished
+        async with semaphore:
+            if limiter is not None:
+                await limiter.acquire()
+            try:
+                await job(item)
+                results[index] = (item, None)
+            except Exception as e:
+                results[index] = (item, e)
+        finished += 1
+        if on_done is not None:
+            # A failed progress report must not abort jobs that are still running
+            try:
+                await on_done(finished)
+            except Exception as e:
+                print(f"Error reporting progress: {e}")
+
+    await asyncio.gather(*(run(index, item) for index, item in enumerate(items)))
+    return results
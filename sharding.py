@@ -0,0 +1,35 @@
+def parse_shard_ids(text):
+    """Shard IDs from a spec like "0-3,6", or None for an empty spec (every shard)"""
+    shard_ids = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            shard_ids.extend(range(int(first), int(last) + 1))
+        else:
+            shard_ids.append(int(part))
+    return sorted(set(shard_ids)) or None
+
+def format_shard_ids(shard_ids):
+    """Inverse of parse_shard_ids for a contiguous range, e.g. [0, 1, 2] -> "0-2" """
+    if len(shard_ids) == 1:
+        return str(shard_ids[0])
+    if shard_ids == list(range(shard_ids[0], shard_ids[-1] + 1)):
+        return f"{shard_ids[0]}-{shard_ids[-1]}"
+    return ",".join(map(str, shard_ids))
+
+def split_shards(shard_count, workers):
+    """Contiguous shard ranges for each worker, as even as possible"""
+    workers = max(1, min(workers, shard_count))
+    return [
+        list(range(index * shard_count // workers, (index + 1) * shard_count // workers))
+        for index in range(workers)
+    ]
+
+def shard_for_guild(guild_id, shard_count):
+    """Shard Discord routes a guild's events to. DMs (no guild) always go to shard 0"""
+    if not guild_id:
+        return 0
+    return (guild_id >> 22) % shard_count
@@ -1,181 +1,348 @@
 import discord
-import json
-from datetime import datetime
+import time
+from collections import OrderedDict
+from emoji_registry import get_emoji
+from persistence import WriteBehind
+from storage import async_storage
+from cache import LRUCache
+from snipe_history import ChannelHistory, SnipeRecord, authors
+from pager import Pager, ViewRegistry
+from outbound import outbound
+from metrics import metrics
+import config
 
-def load_emojis():
-    """Load emojis from emojis.json"""
-    try:
-        with open('emojis.json', 'r') as f:
-            data = json.load(f)
-            return data['emojis']
-    except FileNotFoundError:
-        return {}
-
-def load_deleted_messages():
-    """Load deleted messages from deleted.json"""
-    try:
-        with open('deleted.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+# Most matches a snipe search or author filter returns
+SNIPE_MATCH_LIMIT = 100
+# Seconds between TTL sweeps over every channel
+SWEEP_INTERVAL = 60.0
 
-def save_deleted_messages(data):
-    """Save deleted messages to deleted.json"""
-    with open('deleted.json', 'w') as f:
-        json.dump(data, f, indent=2)
+class SnipeStore:
+    """Per-channel indexed histories of deleted messages, written back to storage in batches.
 
-async def track_message_delete(message):
-    """Track deleted messages"""
+    Histories share one memory budget: once it is exceeded, the least recently used
+    channels are dropped whole (from storage too, snipes are short-lived by nature).
+    """
+
+    def __init__(self, limit=config.SNIPE_HISTORY_SIZE, ttl=config.SNIPE_HISTORY_TTL,
+                 memory_budget=config.SNIPE_MEMORY_BUDGET):
+        self.limit = limit
+        self.ttl = ttl
+        self.memory_budget = memory_budget
+        # Least recently used channel first
+        self.channels = OrderedDict()
+        # Approximate bytes held by every history together
+        self.bytes = 0
+        self._last_sweep = time.monotonic()
+        # Changes since the last write: new records per channel (oldest first) and cleared channels
+        self._added = {}
+        self._cleared = set()
+        # Write every few seconds, or straight away during a purge
+        self.writer = WriteBehind(self.save, delay=5.0, max_pending=100)
+
+    async def load(self):
+        """Load deleted messages from storage, called once at startup"""
+        snipes = await async_storage.load_snipes()
+        now = time.time()
+        self.channels = OrderedDict()
+        self.bytes = 0
+        for channel_id, messages in snipes.items():
+            history = ChannelHistory(self.limit, self.ttl)
+            for entry in reversed(messages):
+                history.add(SnipeRecord.from_entry(entry))
+            history.expire(now)
+            if history:
+                self.channels[channel_id] = history
+                self.bytes += history.bytes
+            else:
+                self._cleared.add(channel_id)
+        self._enforce_budget()
+        if self._cleared:
+            self.writer.mark_dirty()
+
+    async def save(self):
+        added, self._added = self._added, {}
+        cleared, self._cleared = self._cleared, set()
+        entries = {channel_id: [record.to_entry() for record in records] for channel_id, records in added.items()}
+        try:
+            await async_storage.write_snipes(entries, cleared, self.limit)
+        except Exception:
+            for channel_id, records in added.items():
+                self._added[channel_id] = records + self._added.get(channel_id, [])
+            self._cleared |= cleared
+            raise
+
+    async def flush(self):
+        """Write pending changes to storage now (used on shutdown)"""
+        await self.writer.flush()
+
+    def memory_stats(self):
+        return {"channels": len(self.channels), "bytes": self.bytes, "authors": len(authors)}
+
+    def get(self, channel_id):
+        """Deleted message history for a channel (indexable newest first), or None"""
+        history = self.channels.get(channel_id)
+        if history is None:
+            return None
+        self.channels.move_to_end(channel_id)
+        self._expire(channel_id, history, time.time())
+        return history if history else None
+
+    def add(self, channel_id, record):
+        self.add_many(channel_id, [record])
+
+    def add_many(self, channel_id, records):
+        """Add deleted messages (oldest first) to a channel as one batch"""
+        history = self.channels.get(channel_id)
+        if history is None:
+            history = self.channels[channel_id] = ChannelHistory(self.limit, self.ttl)
+        self.channels.move_to_end(channel_id)
+        # The history drops the oldest records once the channel is full
+        held = history.bytes
+        for record in records:
+            history.add(record)
+        self.bytes += history.bytes - held
+        self._added.setdefault(channel_id, []).extend(records)
+        self.writer.mark_dirty(len(records))
+        self._sweep_expired()
+        self._enforce_budget()
+
+    def clear(self, channel_id):
+        """Forget a channel's deleted messages, returns False if there were none"""
+        if not self.channels.get(channel_id):
+            return False
+        self._drop(channel_id)
+        return True
+
+    def _drop(self, channel_id):
+        history = self.channels.pop(channel_id)
+        self.bytes -= history.bytes
+        self._added.pop(channel_id, None)
+        self._cleared.add(channel_id)
+        self.writer.mark_dirty()
+
+    def _expire(self, channel_id, history, now):
+        held = history.bytes
+        history.expire(now)
+        self.bytes += history.bytes - held
+        if not history:
+            # Everything ran past the TTL, stop holding an empty history
+            self._drop(channel_id)
+
+    def _sweep_expired(self):
+        """Expire every channel now and then, so idle channels don't keep old messages"""
+        if time.monotonic() - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = time.monotonic()
+        now = time.time()
+        for channel_id, history in list(self.channels.items()):
+            self._expire(channel_id, history, now)
+
+    def _enforce_budget(self):
+        # Never evict the channel that was just written to
+        while self.bytes > self.memory_budget and len(self.channels) > 1:
+            self._drop(next(iter(self.channels)))
+
+snipe_store = SnipeStore()
+
+# Live snipe pagers, the oldest lose their buttons once there are too many
+snipe_pagers = ViewRegistry(config.SNIPE_PAGER_MAX_VIEWS)
+
+# Author, content and guild of recent messages keyed by message ID, for deletes of
+# messages discord.py didn't cache
+content_cache = LRUCache(config.SNIPE_CONTENT_CACHE_SIZE)
+
+def _message_parts(message):
+    """(author, content, guild ID) worth keeping for a message, or None if it shouldn't be tracked"""
     if message.author.bot or not message.content:
-        return
-    
-    deleted_data = load_deleted_messages()
-    channel_id = str(message.channel.id)
-    
-    if channel_id not in deleted_data:
-        deleted_data[channel_id] = []
+        return None
     
     # Get avatar URL with proper format
     avatar_url = str(message.author.avatar.url) if message.author.avatar else None
     
-    # Add deleted message
-    deleted_data[channel_id].insert(0, {
-        "author": message.author.name,
-        "author_id": str(message.author.id),
-        "avatar_url": avatar_url,
-        "content": message.content,
-        "timestamp": datetime.now().isoformat()
-    })
+    author = authors.get(message.author.id, message.author.name, avatar_url)
+    return author, message.content, message.guild.id if message.guild else None
+
+def remember_message(message):
+    """Keep a new message's content around in case it's deleted after leaving discord.py's cache"""
+    if content_cache.maxsize <= 0:
+        return
+    parts = _message_parts(message)
+    if parts is not None:
+        content_cache.put(message.id, parts)
+
+def _deleted_record(message_id, cached_message):
+    """Record for a deleted message from either cache, stamped with the deletion time"""
+    cached_parts = content_cache.pop(message_id)
+    parts = _message_parts(cached_message) if cached_message is not None else cached_parts
+    if parts is None:
+        return None
+    author, content, guild_id = parts
+    return SnipeRecord(author, content, int(time.time()), guild_id)
+
+async def track_message_delete(message):
+    """Track deleted messages"""
+    record = _deleted_record(message.id, message)
+    if record is not None:
+        # Add deleted message
+        snipe_store.add(str(message.channel.id), record)
+
+async def track_raw_message_delete(payload):
+    """Track a deleted message whether or not discord.py had it cached"""
+    record = _deleted_record(payload.message_id, payload.cached_message)
+    if record is not None:
+        snipe_store.add(str(payload.channel_id), record)
+
+async def track_raw_bulk_message_delete(payload):
+    """Track a purge as one batch, so it costs a single storage write"""
+    cached = {message.id: message for message in payload.cached_messages}
     
-    # Keep only last 10 deleted messages per channel
-    if len(deleted_data[channel_id]) > 10:
-        deleted_data[channel_id] = deleted_data[channel_id][:10]
+    # Message IDs are snowflakes, so sorting them puts the oldest first
+    records = []
+    for message_id in sorted(payload.message_ids):
+        record = _deleted_record(message_id, cached.get(message_id))
+        if record is not None:
+            records.append(record)
     
-    save_deleted_messages(deleted_data)
+    if records:
+        snipe_store.add_many(str(payload.channel_id), records)
 
 async def clearsnipe_command(ctx):
     """Clear all deleted messages for the current channel"""
-    emojis = load_emojis()
-    
     # Check if user has manage_messages permission
     if not ctx.author.guild_permissions.manage_messages:
-        warn_emoji_id = emojis.get("warn")
-        warn_emoji = f"<:custom:{warn_emoji_id}>" if warn_emoji_id else "⚠️"
+        warn_emoji = get_emoji("warn", "⚠️")
         embed = discord.Embed(
             description=f"{warn_emoji} {ctx.author.mention}: You're missing permission: `manage_messages`",
             color=discord.Color.yellow()
         )
-        await ctx.send(embed=embed)
+        await outbound.reply(ctx.channel, embed)
         return
     
     try:
-        deleted_data = load_deleted_messages()
-        channel_id = str(ctx.channel.id)
-        
-        # Check if there are any messages to clear
-        if channel_id not in deleted_data or not deleted_data[channel_id]:
-            warn_emoji_id = emojis.get("warn")
-            warn_emoji = f"<:custom:{warn_emoji_id}>" if warn_emoji_id else "⚠️"
+        # Clear messages for this channel
+        if not snipe_store.clear(str(ctx.channel.id)):
+            warn_emoji = get_emoji("warn", "⚠️")
             embed = discord.Embed(
                 description=f"{warn_emoji} {ctx.author.mention}: No deleted messages to clear",
                 color=discord.Color.yellow()
             )
-            await ctx.send(embed=embed)
+            await outbound.reply(ctx.channel, embed)
             return
         
-        # Clear messages for this channel
-        del deleted_data[channel_id]
-        save_deleted_messages(deleted_data)
-        
         # Send success embed
-        approve_emoji_id = emojis.get("approve")
-        approve_emoji = f"<:custom:{approve_emoji_id}>" if approve_emoji_id else "✅"
+        approve_emoji = get_emoji("approve", "✅")
         embed = discord.Embed(
             description=f"{approve_emoji} {ctx.author.mention}: All deleted messages cleared",
             color=discord.Color.green()
         )
-        await ctx.send(embed=embed)
+        await outbound.reply(ctx.channel, embed)
         
     except Exception as e:
         print(f"Error in clearsnipe command: {e}")
-        warn_emoji_id = emojis.get("warn")
-        warn_emoji = f"<:custom:{warn_emoji_id}>" if warn_emoji_id else "⚠️"
+        metrics.count_error("command", "clearsnipe")
+        warn_emoji = get_emoji("warn", "⚠️")
         embed = discord.Embed(
             description=f"{warn_emoji} {ctx.author.mention}: An error occurred",
             color=discord.Color.yellow()
         )
-        await ctx.send(embed=embed)
+        await outbound.reply(ctx.channel, embed)
 
-async def snipe_command(ctx, page=1):
-    """Show deleted message from the current channel"""
-    try:
-        deleted_data = load_deleted_messages()
-        channel_id = str(ctx.channel.id)
-        
-        # Check if there are deleted messages in this channel
-        if channel_id not in deleted_data or not deleted_data[channel_id]:
-            embed = discord.Embed(
-                description=f"🔍 {ctx.author.mention}: No deleted messages found!",
-                color=discord.Color.from_rgb(128, 128, 128)
-            )
-            await ctx.send(embed=embed)
-            return
-        
-        messages = deleted_data[channel_id]
-        total_pages = len(messages)
-        
-        # Validate page number
-        if page < 1 or page > total_pages:
-            embed = discord.Embed(
-                description=f"🔍 {ctx.author.mention}: Invalid page number. Valid pages: 1-{total_pages}",
-                color=discord.Color.from_rgb(128, 128, 128)
-            )
-            await ctx.send(embed=embed)
-            return
-        
-        # Get the message at the requested page
-        deleted_msg = messages[page - 1]
-        
-        # Calculate time ago
-        msg_datetime = datetime.fromisoformat(deleted_msg["timestamp"])
-        now = datetime.now()
-        time_diff = now - msg_datetime
-        total_seconds = int(time_diff.total_seconds())
-        
-        # Format time display
-        if total_seconds < 60:
-            time_display = f"{total_seconds} seconds"
-        elif total_seconds < 3600:
-            minutes = total_seconds // 60
-            seconds = total_seconds % 60
-            time_display = f"{minutes}m {seconds}s"
-        else:
-            hours = total_seconds // 3600
-            time_display = f"{hours}h"
-        
-        # Create embed with deleted message and avatar
+def _snipe_embed(deleted_msg, page, total_pages):
+    """Embed showing one deleted message"""
+    # Calculate time ago
+    total_seconds = max(0, int(time.time()) - deleted_msg.deleted_at)
+    
+    # Format time display
+    if total_seconds < 60:
+        time_display = f"{total_seconds} seconds"
+    elif total_seconds < 3600:
+        minutes = total_seconds // 60
+        seconds = total_seconds % 60
+        time_display = f"{minutes}m {seconds}s"
+    else:
+        hours = total_seconds // 3600
+        time_display = f"{hours}h"
+    
+    # Create embed with deleted message and avatar
+    embed = discord.Embed(
+        description=deleted_msg.content,
+        color=discord.Color.from_rgb(128, 128, 128)
+    )
+    
+    # Set author with avatar if available
+    author_name = deleted_msg.author.name
+    avatar_url = deleted_msg.author.avatar_url
+    
+    if avatar_url:
+        embed.set_author(name=author_name, icon_url=avatar_url)
+    else:
+        embed.set_author(name=author_name)
+    
+    embed.set_footer(text=f"Deleted {time_display} ago • {page}/{total_pages}")
+    return embed
+
+async def _send_snipe_page(ctx, messages, page, not_found):
+    """Send a pager over deleted messages (newest first) opened at page, or explain why there is none"""
+    # Check if there are deleted messages to show
+    if not messages:
         embed = discord.Embed(
-            description=deleted_msg["content"],
+            description=f"🔍 {ctx.author.mention}: {not_found}",
             color=discord.Color.from_rgb(128, 128, 128)
         )
+        await outbound.reply(ctx.channel, embed)
+        return
+    
+    total_pages = len(messages)
+    
+    # Validate page number
+    if page < 1 or page > total_pages:
+        embed = discord.Embed(
+            description=f"🔍 {ctx.author.mention}: Invalid page number. Valid pages: 1-{total_pages}",
+            color=discord.Color.from_rgb(128, 128, 128)
+        )
+        await outbound.reply(ctx.channel, embed)
+        return
+    
+    # A single page needs no buttons
+    if total_pages == 1:
+        await outbound.reply(ctx.channel, _snipe_embed(messages[0], page, total_pages))
+        return
+    
+    # Snapshot the matches so later deletes don't shift pages under the buttons
+    pager = Pager(ctx.author.id, list(messages), _snipe_embed, snipe_pagers,
+                  page=page, timeout=config.SNIPE_PAGER_TIMEOUT)
+    await pager.start(ctx)
+
+async def _send_snipe_error(ctx, command_name, e):
+    print(f"Error in {command_name} command: {e}")
+    metrics.count_error("command", command_name)
+    embed = discord.Embed(
+        description="🔍 An error occurred while retrieving the deleted message.",
+        color=discord.Color.from_rgb(128, 128, 128)
+    )
+    await outbound.reply(ctx.channel, embed)
+
+async def snipe_command(ctx, page=1, author=None):
+    """Show deleted message from the current channel, optionally only those by author"""
+    try:
+        history = snipe_store.get(str(ctx.channel.id))
         
-        # Set author with avatar if available
-        author_name = deleted_msg["author"]
-        avatar_url = deleted_msg.get("avatar_url")
-        
-        if avatar_url:
-            embed.set_author(name=author_name, icon_url=avatar_url)
-        else:
-            embed.set_author(name=author_name)
+        if author is None:
+            await _send_snipe_page(ctx, history or (), page, "No deleted messages found!")
+            return
         
-        embed.set_footer(text=f"Deleted {time_display} ago • {page}/{total_pages}")
+        messages = history.by_author(author.id, SNIPE_MATCH_LIMIT) if history else []
+        await _send_snipe_page(ctx, messages, page, f"No deleted messages from **{author.name}** found!")
         
-        await ctx.send(embed=embed)
+    except Exception as e:
+        await _send_snipe_error(ctx, "snipe", e)
+
+async def snipe_search_command(ctx, term, page=1):
+    """Show deleted messages from the current channel containing every word of term"""
+    try:
+        history = snipe_store.get(str(ctx.channel.id))
+        messages = history.search(term, SNIPE_MATCH_LIMIT) if history else []
+        await _send_snipe_page(ctx, messages, page, "No deleted messages match that search!")
         
     except Exception as e:
-        print(f"Error in snipe command: {e}")
-        embed = discord.Embed(
-            description="🔍 An error occurred while retrieving the deleted message.",
-            color=discord.Color.from_rgb(128, 128, 128)
-        )
-        await ctx.send(embed=embed)
+        await _send_snipe_error(ctx, "snipe search", e)
@@ -0,0 +1,204 @@
+import bisect
+import re
+import sys
+import weakref
+from datetime import datetime
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Shorter words match too much to be worth indexing
+MIN_TOKEN_LENGTH = 2
+
+def tokenize(text):
+    """Distinct lowercase words in text that are worth indexing"""
+    return {token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) >= MIN_TOKEN_LENGTH}
+
+# Rough per-record cost beyond the content string: the record, its list slots and index postings
+RECORD_OVERHEAD = 160
+POSTING_SIZE = 8
+
+class AuthorInfo:
+    """Author name and avatar, shared by every record from the same author"""
+
+    __slots__ = ('id', 'name', 'avatar_url', '__weakref__')
+
+    def __init__(self, author_id, name, avatar_url):
+        self.id = author_id
+        self.name = name
+        self.avatar_url = avatar_url
+
+class AuthorTable:
+    """Interns AuthorInfo per author so records don't each carry their own copy"""
+
+    def __init__(self):
+        # Authors disappear once no record or cache entry refers to them
+        self._authors = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self._authors)
+
+    def get(self, author_id, name, avatar_url):
+        author = self._authors.get(author_id)
+        if author is None or author.name != name or author.avatar_url != avatar_url:
+            author = self._authors[author_id] = AuthorInfo(author_id, sys.intern(name), avatar_url)
+        return author
+
+authors = AuthorTable()
+
+def parse_timestamp(value):
+    """Epoch seconds from a stored timestamp, which older versions saved as ISO strings"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    # TEXT columns hand epoch seconds back as strings
+    if value.isdigit():
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+class SnipeRecord:
+    """One deleted message"""
+
+    __slots__ = ('author', 'content', 'deleted_at', 'guild_id')
+
+    def __init__(self, author, content, deleted_at, guild_id=None):
+        self.author = author
+        self.content = content
+        # Epoch seconds
+        self.deleted_at = deleted_at
+        self.guild_id = guild_id
+
+    @classmethod
+    def from_entry(cls, entry):
+        """Record from a storage entry dict"""
+        author = authors.get(int(entry["author_id"]), entry["author"], entry.get("avatar_url"))
+        return cls(author, entry["content"], parse_timestamp(entry["timestamp"]), entry.get("guild_id"))
+
+    def to_entry(self):
+        """Storage entry dict for this record"""
+        return {
+            "guild_id": self.guild_id,
+            "author": self.author.name,
+            "author_id": str(self.author.id),
+            "avatar_url": self.author.avatar_url,
+            "content": self.content,
+            "timestamp": self.deleted_at
+        }
+
+def record_size(record, token_count):
+    """Approximate bytes a record costs while held in a history"""
+    return RECORD_OVERHEAD + sys.getsizeof(record.content) + POSTING_SIZE * (token_count + 1)
+
+def _prune_index(index, first_seq):
+    """Drop sequence numbers below first_seq from every posting list, and empty lists"""
+    pruned = {}
+    for key, seqs in index.items():
+        start = bisect.bisect_left(seqs, first_seq)
+        if start < len(seqs):
+            pruned[key] = seqs[start:] if start else seqs
+    return pruned
+
+class ChannelHistory:
+    """Deleted messages of one channel with an author index and an inverted word index.
+
+    Entries get increasing sequence numbers. Evicting the oldest entries only moves
+    a start offset; the lists and indexes are compacted once more than half of them
+    is dead, so adds stay amortised O(words) and lookups never scan every record.
+    """
+
+    def __init__(self, capacity, ttl=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        # Oldest to newest, live entries start at _start
+        self._entries = []
+        self._sizes = []
+        self._start = 0
+        # Approximate bytes held by live entries
+        self.bytes = 0
+        # Sequence number of _entries[0]
+        self._base = 0
+        # author ID / word -> ascending sequence numbers
+        self._by_author = {}
+        self._by_token = {}
+
+    def __len__(self):
+        return len(self._entries) - self._start
+
+    def __getitem__(self, index):
+        """Entry by position, newest first"""
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._entries[len(self._entries) - 1 - index]
+
+    def __iter__(self):
+        """Entries newest first"""
+        for position in range(len(self._entries) - 1, self._start - 1, -1):
+            yield self._entries[position]
+
+    def add(self, record):
+        """Append a record, evicting the oldest past capacity"""
+        seq = self._base + len(self._entries)
+        tokens = tokenize(record.content)
+        size = record_size(record, len(tokens))
+        self._entries.append(record)
+        self._sizes.append(size)
+        self.bytes += size
+        self._by_author.setdefault(record.author.id, []).append(seq)
+        for token in tokens:
+            self._by_token.setdefault(token, []).append(seq)
+        self._evict(len(self) - self.capacity)
+
+    def expire(self, now):
+        """Drop entries older than the TTL"""
+        if not self.ttl:
+            return
+        cutoff = now - self.ttl
+        # Records are appended in deletion order, so expired ones are all at the front
+        end = self._start
+        while end < len(self._entries) and self._entries[end].deleted_at < cutoff:
+            end += 1
+        self._evict(end - self._start)
+
+    def _evict(self, count):
+        count = min(count, len(self))
+        if count <= 0:
+            return
+        self.bytes -= sum(self._sizes[self._start:self._start + count])
+        self._start += count
+        if self._start > len(self._entries) // 2:
+            self._compact()
+
+    def _compact(self):
+        first_seq = self._base + self._start
+        del self._entries[:self._start]
+        del self._sizes[:self._start]
+        self._base = first_seq
+        self._start = 0
+        self._by_author = _prune_index(self._by_author, first_seq)
+        self._by_token = _prune_index(self._by_token, first_seq)
+
+    def _walk(self, seqs, limit=None):
+        """Live entries for ascending seqs, newest first"""
+        first_seq = self._base + self._start
+        found = []
+        for seq in reversed(seqs):
+            if seq < first_seq or (limit is not None and len(found) >= limit):
+                break
+            found.append(self._entries[seq - self._base])
+        return found
+
+    def by_author(self, author_id, limit=None):
+        """Deleted messages by one author, newest first"""
+        return self._walk(self._by_author.get(author_id, ()), limit)
+
+    def search(self, term, limit=None):
+        """Deleted messages containing every word of term, newest first"""
+        tokens = tokenize(term)
+        if not tokens:
+            return []
+        postings = [self._by_token.get(token) for token in tokens]
+        if not all(postings):
+            return []
+        if len(postings) == 1:
+            return self._walk(postings[0], limit)
+        # Intersect the words' sequence lists in C, starting from the rarest, without touching any content
+        postings.sort(key=len)
+        common = set(postings[0]).intersection(*postings[1:])
+        return self._walk(sorted(common), limit)
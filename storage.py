@@ -0,0 +1,392 @@
+import os
+import sqlite3
+import config
+from persistence import load_json, atomic_write_json, run_io
+from metrics import metrics
+
+# Guild ID used for AFK entries that apply in every guild
+GLOBAL_GUILD_ID = 0
+
+# Every backend exposes the same batched API: load_* returns the whole table,
+# write_* applies only the rows that changed since the last write.
+
+class JsonStorage:
+    """Legacy backend that keeps each table in its own JSON file"""
+
+    LOCKS_PATH = os.path.join(config.DATA_DIR, 'lock.json')
+    AFK_PATH = os.path.join(config.DATA_DIR, 'afk_data.json')
+    SNIPES_PATH = os.path.join(config.DATA_DIR, 'deleted.json')
+
+    def __init__(self):
+        self._locks = None
+        self._afk = None
+        self._snipes = None
+
+    def has_data(self):
+        """Whether any of the legacy JSON files exist"""
+        return any(os.path.exists(path) for path in (self.LOCKS_PATH, self.AFK_PATH, self.SNIPES_PATH))
+
+    def close(self):
+        pass
+
+    # Locks
+
+    def load_locks(self):
+        if self._locks is None:
+            self._locks = load_json(self.LOCKS_PATH, {"locked_channels": {}})["locked_channels"]
+        return dict(self._locks)
+
+    def get_lock(self, channel_id):
+        if self._locks is None:
+            self.load_locks()
+        return self._locks.get(channel_id)
+
+    def write_locks(self, upserts, deletes=()):
+        if self._locks is None:
+            self.load_locks()
+        self._locks.update(upserts)
+        for channel_id in deletes:
+            self._locks.pop(channel_id, None)
+        atomic_write_json(self.LOCKS_PATH, {"locked_channels": self._locks})
+
+    # AFK
+
+    def load_afk(self):
+        """AFK entries as {guild ID: {user ID: info}}"""
+        if self._afk is None:
+            data = load_json(self.AFK_PATH, {})
+            # Before AFK was per guild the file was a flat {user ID: info} map
+            legacy = {user_id: info for user_id, info in data.items() if "status" in info}
+            self._afk = {guild_id: users for guild_id, users in data.items() if guild_id not in legacy}
+            if legacy:
+                self._afk.setdefault(str(GLOBAL_GUILD_ID), {}).update(legacy)
+        return {
+            int(guild_id): {int(user_id): info for user_id, info in users.items()}
+            for guild_id, users in self._afk.items()
+        }
+
+    def write_afk(self, upserts, deletes=()):
+        """upserts maps (guild ID, user ID) to info, deletes lists (guild ID, user ID) pairs"""
+        if self._afk is None:
+            self.load_afk()
+        for (guild_id, user_id), info in upserts.items():
+            self._afk.setdefault(str(guild_id), {})[str(user_id)] = info
+        for guild_id, user_id in deletes:
+            users = self._afk.get(str(guild_id), {})
+            users.pop(str(user_id), None)
+            if not users:
+                self._afk.pop(str(guild_id), None)
+        atomic_write_json(self.AFK_PATH, self._afk)
+
+    # Snipes
+
+    def load_snipes(self):
+        """Deleted messages per channel, newest first"""
+        if self._snipes is None:
+            self._snipes = load_json(self.SNIPES_PATH, {})
+        return {channel_id: list(messages) for channel_id, messages in self._snipes.items()}
+
+    def write_snipes(self, added, cleared=(), limit=None):
+        """Drop cleared channels, then add new entries (oldest first) keeping at most limit per channel"""
+        if self._snipes is None:
+            self.load_snipes()
+        for channel_id in cleared:
+            self._snipes.pop(channel_id, None)
+        for channel_id, entries in added.items():
+            messages = entries[::-1] + self._snipes.get(channel_id, [])
+            self._snipes[channel_id] = messages[:limit] if limit else messages
+        atomic_write_json(self.SNIPES_PATH, self._snipes)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS locks (
+    channel_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    channel_name TEXT,
+    locked_by TEXT,
+    expires_at REAL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS locks_guild ON locks (guild_id);
+CREATE INDEX IF NOT EXISTS locks_expiry ON locks (expires_at) WHERE expires_at IS NOT NULL;
+CREATE TABLE IF NOT EXISTS afk (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS snipes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel_id INTEGER NOT NULL,
+    guild_id INTEGER,
+    author TEXT,
+    author_id INTEGER,
+    avatar_url TEXT,
+    content TEXT,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS snipes_channel ON snipes (channel_id, id);
+"""
+
+class SqliteStorage:
+    """SQLite backend in WAL mode, one row per lock, AFK entry and deleted message"""
+
+    def __init__(self, path):
+        self.path = path
+        # Only ever used from the storage I/O thread, which may not be the one that opened it
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._upgrade_schema()
+        self.conn.executescript(SCHEMA)
+
+    def _upgrade_schema(self):
+        """Bring tables created by older versions up to date before SCHEMA runs"""
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(locks)")]
+        if columns and "expires_at" not in columns:
+            # Timed locks store their expiry with the lock
+            with self.conn:
+                self.conn.execute("ALTER TABLE locks ADD COLUMN expires_at REAL")
+        if columns and "source" not in columns:
+            # Locks found on startup are told apart from the bot's own
+            with self.conn:
+                self.conn.execute("ALTER TABLE locks ADD COLUMN source TEXT")
+
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(afk)")]
+        if columns and "guild_id" not in columns:
+            # AFK became per guild, existing entries keep applying everywhere
+            with self.conn:
+                self.conn.execute(
+                    "CREATE TABLE afk_new (guild_id INTEGER NOT NULL, user_id INTEGER NOT NULL, "
+                    "status TEXT NOT NULL, timestamp TEXT NOT NULL, PRIMARY KEY (guild_id, user_id))"
+                )
+                self.conn.execute(
+                    "INSERT INTO afk_new (guild_id, user_id, status, timestamp) "
+                    "SELECT ?, user_id, status, timestamp FROM afk", (GLOBAL_GUILD_ID,)
+                )
+                self.conn.execute("DROP TABLE afk")
+                self.conn.execute("ALTER TABLE afk_new RENAME TO afk")
+
+    def close(self):
+        self.conn.close()
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # Locks
+
+    def load_locks(self):
+        rows = self.conn.execute("SELECT channel_id, guild_id, channel_name, locked_by, expires_at, source FROM locks")
+        return {str(channel_id): _lock_info(*row) for channel_id, *row in rows}
+
+    def get_lock(self, channel_id):
+        row = self.conn.execute(
+            "SELECT guild_id, channel_name, locked_by, expires_at, source FROM locks WHERE channel_id = ?", (int(channel_id),)
+        ).fetchone()
+        return _lock_info(*row) if row else None
+
+    def write_locks(self, upserts, deletes=()):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO locks (channel_id, guild_id, channel_name, locked_by, expires_at, source) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(int(channel_id), int(info["guild_id"]), info.get("channel_name"), info.get("locked_by"),
+                  info.get("expires_at"), info.get("source"))
+                 for channel_id, info in upserts.items()]
+            )
+            self.conn.executemany("DELETE FROM locks WHERE channel_id = ?", [(int(channel_id),) for channel_id in deletes])
+
+    # AFK
+
+    def load_afk(self):
+        """AFK entries as {guild ID: {user ID: info}}"""
+        afk = {}
+        rows = self.conn.execute("SELECT guild_id, user_id, status, timestamp FROM afk")
+        for guild_id, user_id, status, timestamp in rows:
+            afk.setdefault(guild_id, {})[user_id] = {"status": status, "timestamp": timestamp}
+        return afk
+
+    def write_afk(self, upserts, deletes=()):
+        """upserts maps (guild ID, user ID) to info, deletes lists (guild ID, user ID) pairs"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO afk (guild_id, user_id, status, timestamp) VALUES (?, ?, ?, ?)",
+                [(guild_id, user_id, info["status"], info["timestamp"]) for (guild_id, user_id), info in upserts.items()]
+            )
+            self.conn.executemany("DELETE FROM afk WHERE guild_id = ? AND user_id = ?", list(deletes))
+
+    # Snipes
+
+    def load_snipes(self):
+        """Deleted messages per channel, newest first"""
+        snipes = {}
+        rows = self.conn.execute(
+            "SELECT channel_id, guild_id, author, author_id, avatar_url, content, timestamp "
+            "FROM snipes ORDER BY channel_id, id DESC"
+        )
+        for channel_id, guild_id, author, author_id, avatar_url, content, timestamp in rows:
+            entry = {
+                "author": author,
+                "author_id": str(author_id),
+                "avatar_url": avatar_url,
+                "content": content,
+                "timestamp": timestamp
+            }
+            if guild_id is not None:
+                entry["guild_id"] = guild_id
+            snipes.setdefault(str(channel_id), []).append(entry)
+        return snipes
+
+    def write_snipes(self, added, cleared=(), limit=None):
+        """Drop cleared channels, then add new entries (oldest first) keeping at most limit per channel"""
+        with self.conn:
+            self.conn.executemany("DELETE FROM snipes WHERE channel_id = ?", [(int(channel_id),) for channel_id in cleared])
+            self.conn.executemany(
+                "INSERT INTO snipes (channel_id, guild_id, author, author_id, avatar_url, content, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(int(channel_id), entry.get("guild_id"), entry["author"], int(entry["author_id"]),
+                  entry.get("avatar_url"), entry["content"], entry["timestamp"])
+                 for channel_id, entries in added.items() for entry in entries]
+            )
+            if limit:
+                # Drop everything older than the newest `limit` rows of each touched channel
+                self.conn.executemany(
+                    "DELETE FROM snipes WHERE channel_id = ? AND id <= "
+                    "(SELECT id FROM snipes WHERE channel_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    [(int(channel_id), int(channel_id), limit) for channel_id in added]
+                )
+
+    def migrate_from_json(self, legacy):
+        """One-shot import of the legacy JSON files, skipped once it has run"""
+        if self.get_meta("json_migrated") or not legacy.has_data():
+            return False
+        self.write_locks(legacy.load_locks())
+        self.write_afk({
+            (guild_id, user_id): info
+            for guild_id, users in legacy.load_afk().items()
+            for user_id, info in users.items()
+        })
+        # JSON keeps newest first, the snipes table expects oldest first
+        self.write_snipes({channel_id: messages[::-1] for channel_id, messages in legacy.load_snipes().items()})
+        self.set_meta("json_migrated", "1")
+        return True
+
+    def copy_partition(self, source_path, owns_guild):
+        """Copy the rows of guilds owns_guild(guild ID) accepts from another database.
+
+        Used to split a single-process database between shard workers. Global AFK
+        entries apply in every guild, so every partition gets a copy of them. Snipes
+        without a guild ID whose guild can't be worked out are not copied.
+        """
+        # Opening the source brings its schema up to date first
+        SqliteStorage(source_path).close()
+        self.conn.create_function("owns_guild", 1, lambda guild_id: bool(owns_guild(guild_id)), deterministic=True)
+        self.conn.execute("ATTACH DATABASE ? AS source", (source_path,))
+        try:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO locks (channel_id, guild_id, channel_name, locked_by, expires_at, source) "
+                    "SELECT channel_id, guild_id, channel_name, locked_by, expires_at, source FROM source.locks "
+                    "WHERE owns_guild(guild_id)"
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO afk (guild_id, user_id, status, timestamp) "
+                    "SELECT guild_id, user_id, status, timestamp FROM source.afk "
+                    "WHERE guild_id = ? OR owns_guild(guild_id)", (GLOBAL_GUILD_ID,)
+                )
+                # Snipes migrated from the legacy JSON files have no guild ID. Take it from
+                # another snipe or a lock in the same channel, and leave out rows where
+                # neither exists, as there is no telling which shard serves them.
+                self.conn.execute(
+                    "INSERT INTO snipes (channel_id, guild_id, author, author_id, avatar_url, content, timestamp) "
+                    "SELECT s.channel_id, COALESCE(s.guild_id, known.guild_id), s.author, s.author_id, "
+                    "s.avatar_url, s.content, s.timestamp FROM source.snipes AS s "
+                    "LEFT JOIN (SELECT channel_id, MAX(guild_id) AS guild_id FROM ("
+                    "SELECT channel_id, guild_id FROM source.snipes WHERE guild_id IS NOT NULL "
+                    "UNION SELECT channel_id, guild_id FROM source.locks) GROUP BY channel_id) AS known "
+                    "ON known.channel_id = s.channel_id "
+                    "WHERE COALESCE(s.guild_id, known.guild_id) IS NOT NULL "
+                    "AND owns_guild(COALESCE(s.guild_id, known.guild_id)) ORDER BY s.id"
+                )
+                # The source already holds whatever legacy JSON there was
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', '1')")
+        finally:
+            self.conn.execute("DETACH DATABASE source")
+
+def _lock_info(guild_id, channel_name, locked_by, expires_at, source=None):
+    info = {"channel_name": channel_name, "locked_by": locked_by, "guild_id": guild_id}
+    if expires_at is not None:
+        info["expires_at"] = expires_at
+    if source is not None:
+        info["source"] = source
+    return info
+
+_storage = None
+
+def get_storage():
+    """Open the configured storage backend on first use"""
+    global _storage
+    if _storage is None:
+        if config.STORAGE_BACKEND == 'json':
+            _storage = JsonStorage()
+        else:
+            _storage = SqliteStorage(config.SQLITE_PATH)
+            if _storage.migrate_from_json(JsonStorage()):
+                print(f"Migrated JSON data into {config.SQLITE_PATH}")
+    return _storage
+
+def close_storage():
+    """Close the storage backend if it was opened"""
+    global _storage
+    if _storage is not None:
+        _storage.close()
+        _storage = None
+
+def _call_backend(method, args):
+    return getattr(get_storage(), method)(*args)
+
+class AsyncStorage:
+    """Awaitable front for the configured backend, every call runs on the storage I/O thread"""
+
+    async def _call(self, method, *args):
+        with metrics.timer("storage", method):
+            return await run_io(_call_backend, method, args)
+
+    async def open(self):
+        with metrics.timer("storage", "open"):
+            await run_io(get_storage)
+
+    async def close(self):
+        await run_io(close_storage)
+
+    def load_locks(self):
+        return self._call('load_locks')
+
+    def get_lock(self, channel_id):
+        return self._call('get_lock', channel_id)
+
+    def write_locks(self, upserts, deletes=()):
+        return self._call('write_locks', upserts, deletes)
+
+    def load_afk(self):
+        return self._call('load_afk')
+
+    def write_afk(self, upserts, deletes=()):
+        return self._call('write_afk', upserts, deletes)
+
+    def load_snipes(self):
+        return self._call('load_snipes')
+
+    def write_snipes(self, added, cleared=(), limit=None):
+        return self._call('write_snipes', added, cleared, limit)
+
+async_storage = AsyncStorage()
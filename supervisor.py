@@ -0,0 +1,156 @@
+"""Runs the bot as several processes, each connected to its own range of shards.
+
+    python supervisor.py --shard-count 8 --workers 4
+
+Every worker keeps its state in its own directory under --data-dir, named after the
+shards it runs. Discord routes a guild to the same shard for as long as the shard
+count stays the same, so each worker only ever sees the guilds whose state it owns.
+Changing --shard-count moves guilds between shards: seed fresh worker directories
+from a combined database with --seed-from when doing that.
+
+Snipes imported from the legacy JSON files carry no guild ID. When seeding, they
+go to the worker serving the guild of another snipe or lock in the same channel.
+Those whose guild can't be worked out that way, like DM snipes, aren't copied.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import time
+from sharding import format_shard_ids, shard_for_guild, split_shards
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+# Restart delay doubles after each crash up to this many seconds
+MAX_BACKOFF = 60.0
+# A worker that stayed up this long is healthy again, so its backoff resets
+STABLE_AFTER = 300.0
+# Seconds a worker gets to flush its state after being asked to stop
+STOP_TIMEOUT = 30.0
+
+class Worker:
+    """One bot process for a range of shards, restarted when it crashes"""
+
+    def __init__(self, shard_ids, shard_count, data_dir, metrics_port, args):
+        self.shard_ids = shard_ids
+        self.name = f"shards {format_shard_ids(shard_ids)}"
+        self.shard_count = shard_count
+        self.data_dir = data_dir
+        self.metrics_port = metrics_port
+        self.args = args
+        self.process = None
+
+    def _env(self):
+        env = dict(os.environ)
+        env['SHARD_COUNT'] = str(self.shard_count)
+        env['SHARD_IDS'] = format_shard_ids(self.shard_ids)
+        env['DATA_DIR'] = self.data_dir
+        # Let the per-directory defaults apply instead of one shared file
+        env.pop('SQLITE_PATH', None)
+        env.pop('TREE_HASH_PATH', None)
+        env['METRICS_PORT'] = str(self.metrics_port)
+        # Print output as it happens rather than when the pipe buffer fills
+        env['PYTHONUNBUFFERED'] = '1'
+        return env
+
+    async def _relay_output(self):
+        async for line in self.process.stdout:
+            print(f"[{self.name}] {line.decode(errors='replace').rstrip()}", flush=True)
+
+    async def run(self, stopping):
+        backoff = 1.0
+        while not stopping.is_set():
+            started = time.monotonic()
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, MAIN, *self.args, env=self._env(),
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                # Keep terminal signals away from workers, stop() asks them to exit exactly once
+                start_new_session=True
+            )
+            print(f"[{self.name}] started (pid {self.process.pid})", flush=True)
+            await self._relay_output()
+            code = await self.process.wait()
+            if stopping.is_set():
+                break
+            if code == 0:
+                # Exited on purpose (e.g. no token), restarting wouldn't help
+                print(f"[{self.name}] exited cleanly, not restarting", flush=True)
+                break
+            if time.monotonic() - started >= STABLE_AFTER:
+                backoff = 1.0
+            print(f"[{self.name}] exited with code {code}, restarting in {backoff:.0f}s", flush=True)
+            try:
+                await asyncio.wait_for(stopping.wait(), backoff)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+    async def stop(self):
+        """Ask the worker to shut down cleanly, killing it if it takes too long"""
+        if self.process is None or self.process.returncode is not None:
+            return
+        # discord.py shuts down gracefully on SIGINT, which runs Bot.close and flushes state
+        self.process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(self.process.wait(), STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"[{self.name}] didn't stop in time, killing it", flush=True)
+            self.process.kill()
+
+def seed_worker(source_path, data_dir, shard_ids, shard_count):
+    """Give a new worker directory the rows of its guilds from a combined database"""
+    # Only needed when seeding, the supervisor doesn't otherwise load the bot's modules
+    from storage import SqliteStorage
+    target_path = os.path.join(data_dir, 'bot.db')
+    if os.path.exists(target_path):
+        return
+    owned = set(shard_ids)
+    storage = SqliteStorage(target_path)
+    try:
+        storage.copy_partition(source_path, lambda guild_id: shard_for_guild(guild_id, shard_count) in owned)
+    finally:
+        storage.close()
+    print(f"Seeded {target_path} from {source_path}")
+
+async def supervise(workers):
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    runs = [asyncio.create_task(worker.run(stopping)) for worker in workers]
+    waiter = asyncio.create_task(stopping.wait())
+    # Return once every worker has exited for good, or a stop was requested
+    await asyncio.wait([waiter, asyncio.gather(*runs)], return_when=asyncio.FIRST_COMPLETED)
+    stopping.set()
+    print("Stopping workers...", flush=True)
+    await asyncio.gather(*(worker.stop() for worker in workers))
+    await asyncio.gather(*runs)
+    waiter.cancel()
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the bot as several sharded worker processes')
+    parser.add_argument('--shard-count', type=int, required=True, help='total shards across all workers')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes to run')
+    parser.add_argument('--data-dir', default='data', help='directory holding one state directory per worker')
+    parser.add_argument('--seed-from', help='combined database to split between new worker directories')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help='metrics port of the first worker, the others count up from it (0 disables)')
+    parser.add_argument('--sync', action='store_true', help='force a command tree sync on startup')
+    args = parser.parse_args()
+
+    workers = []
+    for index, shard_ids in enumerate(split_shards(args.shard_count, args.workers)):
+        data_dir = os.path.join(args.data_dir, f"shards-{format_shard_ids(shard_ids)}")
+        os.makedirs(data_dir, exist_ok=True)
+        if args.seed_from:
+            seed_worker(args.seed_from, data_dir, shard_ids, args.shard_count)
+        metrics_port = args.metrics_port + index if args.metrics_port else 0
+        # Only the worker with shard 0 syncs the command tree, so only it needs --sync
+        worker_args = ['--sync'] if args.sync and 0 in shard_ids else []
+        workers.append(Worker(shard_ids, args.shard_count, data_dir, metrics_port, worker_args))
+
+    asyncio.run(supervise(workers))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import asyncio
+import heapq
+import time
+
+# Longest single sleep, so wall clock adjustments are noticed eventually
+MAX_SLEEP = 300.0
+
+class TimerScheduler:
+    """One task that sleeps until the earliest deadline, however many timers are pending.
+
+    Deadlines are wall clock timestamps so they can be persisted. Every timer that is
+    due when the task wakes up is handed to the callback in a single batch.
+    """
+
+    def __init__(self, callback):
+        # callback is a coroutine function taking a list of due keys
+        self._callback = callback
+        self._heap = []
+        # key -> current deadline, heap entries that don't match are stale and skipped
+        self._deadlines = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def schedule(self, key, deadline):
+        """Fire key at deadline, replacing any earlier timer for the same key"""
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+        # Only wake the task if this timer is now the next one due
+        if self._heap[0][1] == key:
+            self._wakeup.set()
+
+    def cancel(self, key):
+        self._deadlines.pop(key, None)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) == deadline:
+                del self._deadlines[key]
+                due.append(key)
+        return due
+
+    async def _run(self):
+        while True:
+            due = self._pop_due(time.time())
+            if due:
+                try:
+                    await self._callback(due)
+                except Exception as e:
+                    print(f"Error running timers: {e}")
+                continue
+
+            # Drop cancelled entries so they don't decide how long we sleep
+            while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+
+            timeout = MAX_SLEEP
+            if self._heap:
+                timeout = min(MAX_SLEEP, max(0.0, self._heap[0][0] - time.time()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass